@@ -4,33 +4,36 @@ eventlet.monkey_patch()
 import os
 import time as t
 import re
-from io import BytesIO
-from tempfile import NamedTemporaryFile
 
 
-from flask import Flask, render_template, request, session, redirect, url_for, jsonify, send_file
+from flask import Flask, render_template, request, session, redirect, url_for, jsonify, Response
 from flask_socketio import SocketIO
 from flask_cors import CORS
 
-import joblib
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-import subprocess
-import shutil
+import functools
+import zlib
+from importlib.metadata import version as package_version
 from sklearn.feature_extraction.text import HashingVectorizer
 import numpy as np
 import soundfile as sf
-from pydub import AudioSegment
 
 from PyBreathTranscript import transcript as bt
-from PyBreathTranscript.transcript_dtw import get_recognizer, transcribe_file
 
 import PyBreathParams.get_breath_params as get_breath_params
 
 from tools import optimize_audio, create_waveform
 
 from src.utils import *
+from src.streaming import StreamDecoder
+from src import pcm, workers, jobs, silence, sessions, pipeline, features
+from src.executor import Executor
+from src.store import open_store
+from src.models import ModelRegistry
+from src.learning import OnlineLearner
+from src.cache import TranscriptCache
 
 load_dotenv()
 
@@ -41,16 +44,52 @@ OFFLINE_UPLOAD_FOLDER = os.getenv('OFFLINE_UPLOAD_FOLDER', 'offline_recordings')
 AUDIO_FOLDER = os.getenv('AUDIO_FOLDER', 'audio')
 GRAPH_FOLDER = os.getenv('GRAPH_FOLDER', 'graphs')
 MODELS_FOLDER = os.getenv('MODELS_FOLDER', 'models')
+PREDICT_WORKERS = int(os.getenv('PREDICT_WORKERS', os.cpu_count() or 1))
+PREDICT_REQUEST_CONCURRENCY = int(os.getenv('PREDICT_REQUEST_CONCURRENCY', max(1, PREDICT_WORKERS // 2)))
+EXECUTOR_KIND = os.getenv('EXECUTOR_KIND', 'thread')  # thread, process or inline
+EXECUTOR_WORKERS = int(os.getenv('EXECUTOR_WORKERS', PREDICT_WORKERS))
+
+# Multi-worker deployment (see app/main.py): every worker runs with its own WORKER_ID,
+# WORKER_URLS lists the public URL of each worker by id
+WORKER_ID = os.getenv('WORKER_ID', '0')
+WORKER_URLS = [url.rstrip('/') for url in os.getenv('WORKER_URLS', '').split(',') if url]
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')  # e.g. redis://localhost:6379/0
+SESSION_STORE_URL = os.getenv('SESSION_STORE_URL')  # shared session store, in-memory if not set
+HOST = os.getenv('HOST', '0.0.0.0')
+PORT = int(os.getenv('PORT', 5001))
 
 IE_MODEL_FILE = f"{MODELS_FOLDER}/model_transcript_fingerprint.pkl"
+ACTIVITY_MODEL_FILE = f"{MODELS_FOLDER}/model_transcript_breath.pkl"
+MODELS_PRELOAD = str_to_bool(os.getenv('MODELS_PRELOAD', 'true'))  # load and warm up at startup instead of on first use
+MODEL_RELOAD_INTERVAL = float(os.getenv('MODEL_RELOAD_INTERVAL', 5))  # s between checks for changed model files
+ONLINE_LEARNING = str_to_bool(os.getenv('ONLINE_LEARNING', 'false'))  # keep fitting the IE model on confirmed cuts
+ONLINE_LEARNING_BATCH = int(os.getenv('ONLINE_LEARNING_BATCH', 16))  # cuts per partial_fit
+ONLINE_LEARNING_FLUSH_INTERVAL = float(os.getenv('ONLINE_LEARNING_FLUSH_INTERVAL', 60))  # s before a smaller batch is fitted
+ONLINE_LEARNING_CHECKPOINT_SAMPLES = int(os.getenv('ONLINE_LEARNING_CHECKPOINT_SAMPLES', 256))  # fitted cuts before the model is saved
+ONLINE_LEARNING_CHECKPOINT_INTERVAL = float(os.getenv('ONLINE_LEARNING_CHECKPOINT_INTERVAL', 600))  # s between saves otherwise
+
+TRANSCRIPT_CACHE_FOLDER = os.getenv('TRANSCRIPT_CACHE_FOLDER')  # disk tier is off unless set
+TRANSCRIPT_CACHE_MEMORY_BYTES = int(os.getenv('TRANSCRIPT_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+TRANSCRIPT_CACHE_DISK_BYTES = int(os.getenv('TRANSCRIPT_CACHE_DISK_BYTES', 1024 * 1024 * 1024))
+
+SESSION_TTL = float(os.getenv('SESSION_TTL', 30 * 60))  # seconds without a chunk or request
+SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', 60))
+SESSION_TRANSCRIPT_TAIL = int(os.getenv('SESSION_TRANSCRIPT_TAIL', 4096))  # symbols kept in memory
+SESSION_SPILL_FOLDER = os.getenv('SESSION_SPILL_FOLDER', 'session_logs')  # older symbols are read back from here
 
 CHUNK_LENGTH = 200
 RATE = 44100
+CHUNK_QUEUE_SIZE = int(os.getenv('CHUNK_QUEUE_SIZE', 10))  # decoded frames waiting per session
+PCM_RING_SECONDS = float(os.getenv('PCM_RING_SECONDS', 60))  # decoded audio per session kept in memory for /cut
+CUT_DECODE_WAIT = float(os.getenv('CUT_DECODE_WAIT', 0.5))  # s a cut waits for the decoder to reach the cut time
+CHUNK_QUEUE_POLICY = os.getenv('CHUNK_QUEUE_POLICY', pipeline.COALESCE)  # drop_oldest, coalesce or backpressure
+LIVE_PREDICTION_CHUNKS = int(os.getenv('LIVE_PREDICTION_CHUNKS', 5))  # chunks between live predictions, 0 turns them off
+LIVE_PREDICTION_WINDOW = float(os.getenv('LIVE_PREDICTION_WINDOW', 10))  # s of audio since the cut they look at, within the ring
 
 SILENCE_LENGTH = 2
 LETTERS_BEFORE_SILENCE = 2
 SILENCE_VALIDATION = SILENCE_LENGTH + LETTERS_BEFORE_SILENCE
-SILENCE_PATTERN = rf'^[^_]{{{LETTERS_BEFORE_SILENCE}}}[_]{{{SILENCE_LENGTH}}}$'
+DROPPED_SYMBOL = "?"
 
 CUT_FILE = 0
 CUT_LETTERS = 1
@@ -62,49 +101,76 @@ PROD_MODE = 2
 APP_MODE = DEV_MODE
 
 
-def slice_and_get_params(wav_path: str, slice_start, slice_end,
-                         get_ie_audio=False, get_ie_text=False, get_ar_audio=False, get_ar_text=False, transcript = ""):
+def predict_ie_text(transcripts: list[str]) -> list[str]:
     """
-    Load the WAV at wav_path, take only the first `slice_ms` milliseconds,
-    and then call transcribe_file(), bt.transcript(), and get_breath_params on a temporary file.
-    This avoids saving the clipped file permanently to disk.
+    Inhale/exhale by transcript for a whole batch: one vectorizer pass and one predict call.
     """
+    if not transcripts:
+        return []
+    return predict_ie_features(hash_vectorizer.transform(transcripts))
 
-    # 1) Read the original WAV into RAM
-    full_audio = AudioSegment.from_wav(wav_path)
 
-    # 2) Slice out [0: slice_ms] (e.g. first second if slice_ms=1000)
-    clipped = full_audio[slice_start:slice_end]
+def predict_activity_text(transcripts: list[str]) -> list[str]:
+    """
+    Activity by transcript for a whole batch: one vectorizer pass and one predict call.
+    """
+    if not transcripts:
+        return []
+    return predict_activity_features(hash_vectorizer.transform(transcripts))
 
-    # 3) Export that slice into a BytesIO (in WAV format)
-    buf = BytesIO()
-    clipped.export(buf, format="wav")
-    buf.seek(0)
 
-    # 4) Write the clipped audio to a temporary WAV file so we have a filename to pass
-    from tempfile import NamedTemporaryFile
-    with NamedTemporaryFile(suffix=".wav", delete=True) as tmp:
-        tmp.write(buf.read())
-        tmp.flush()
+def predict_ie_features(text_features) -> list[str]:
+    """
+    Inhale/exhale for already featurized transcripts (see src.features).
+    """
+    predictions = executor.run(model_registry.get(IE_MODEL).predict, text_features)
+    return ['exhale' if int(prediction) == 1 else 'inhale' for prediction in predictions]
 
-        ie_audio, ie_text, ar_audio, ar_text = None, None, None, None
 
-        if get_ie_audio:
-            ie_audio = get_breath_params.predict(get_breath_params.IE, tmp.name)
+def predict_activity_features(text_features) -> list[str]:
+    """
+    Activity for already featurized transcripts (see src.features).
+    """
+    predictions = executor.run(model_registry.get(ACTIVITY_MODEL).predict, text_features)
+    return ['active' if int(prediction) == 2 else 'resting' for prediction in predictions] # if == 1 else 'Other'
 
-        if get_ar_audio:
-            ar_audio = get_breath_params.predict(get_breath_params.AR, tmp.name)
 
-        if get_ie_text:
-            ie_prediction = int(ie_fingerprint_model.predict(hash_vectorizer.fit_transform([transcript]))[0])
-            ie_text = 'exhale' if ie_prediction == 1 else 'inhale'
+def model_version(name: str) -> str:
+    return model_registry.version(name)
+
+
+def file_cache(filename: str):
+    """
+    Cache key of a file and a lazy decoder for it: the WAV is only decoded
+    if something has to be computed.
+    """
+    key = transcript_cache.file_key(filename, executor.run)
+    decoded = functools.cache(lambda: executor.run(pcm.read_wav, filename))
+    return key, decoded
+
 
-        if get_ar_text:
-            activity_prediction = int(transcript_model.predict(hash_vectorizer.fit_transform([transcript]))[0])
-            ar_text = 'active' if activity_prediction == 2 else 'resting'
+def cached_transcript(key: str, decoded) -> str:
+    return transcript_cache.get_or_compute(key, "transcript", lambda: executor.run(pcm.transcript, *decoded()))
 
-    # 7) Return both transcription results and breath parameters
-    return ie_audio, ie_text, ar_audio, ar_text
+
+def cached_silence_transcript(key: str, decoded) -> str:
+    return transcript_cache.get_or_compute(key, "silence_transcript", lambda: executor.run(pcm.transcribe, *decoded()))
+
+
+def predict_audio(modes: list, segments: list, rate: int, on_segment=None) -> list[list[str]]:
+    """
+    Breath-param predictions (one list per mode) for every segment.
+    The segments are fanned out over the worker pool and gathered back in order,
+    `on_segment(index)` is called once all predictions of a segment are in.
+    """
+    tasks = [(mode, segment, rate) for segment in segments for mode in modes]
+
+    def on_result(index):
+        if on_segment is not None and (index + 1) % len(modes) == 0:
+            on_segment(index // len(modes))
+
+    results = workers.map_ordered(pcm.breath_params, tasks, PREDICT_WORKERS, PREDICT_REQUEST_CONCURRENCY, on_result)
+    return [results[i::len(modes)] for i in range(len(modes))]
 
 
 def find_silence_indices(s: str) -> list[int]:
@@ -114,16 +180,48 @@ def find_silence_indices(s: str) -> list[int]:
       – LETTERS_BEFORE_SILENCE characters that are not “_”
       – followed immediately by SILENCE_LENGTH underscores.
     """
-    indices: list[int] = []
-    n = len(s)
+    # one pass with run-length counters instead of matching a window at every position
+    return silence.scan(s, LETTERS_BEFORE_SILENCE, SILENCE_LENGTH)
+
+
+def cut_segment(client, cutout: int) -> np.ndarray:
+    """
+    Decoded audio of a live session from its previous cut to `cutout` (ms).
+    The decoder trails the socket by a few frames, so the cut briefly waits for it to catch up.
+    """
+    recording = client.recording
+    if recording is None:
+        return np.zeros((0, 2), dtype=np.int16)
+    deadline = t.monotonic() + CUT_DECODE_WAIT
+    while recording.duration_ms < cutout and client.decoder is not None and t.monotonic() < deadline:
+        socketio.sleep(0.02)
+    segment = recording.read(client.last_cut_ms, cutout)
+    client.last_cut_ms = max(client.last_cut_ms, cutout)
+    return segment
+
+
+def fresh_live_predictions(client, previous_cut_ms: int, cutout: int) -> dict:
+    """
+    Live audio predictions a cut can return instead of predicting again: made for the same phase,
+    from a window that was not capped, at most one live interval before the cut.
+    Text predictions are always made again, they are a single predict on the running features.
+    """
+    live = client.live
+    if live is None or live['since_ms'] != previous_cut_ms:
+        return {}
+    fresh = {}
+    if live['start_ms'] == previous_cut_ms and abs(cutout - live['end_ms']) <= LIVE_PREDICTION_CHUNKS * CHUNK_LENGTH:
+        fresh['ie_predicted_audio'] = live['ie_predicted_audio']
+        fresh['activity_predicted_audio'] = live['activity_predicted_audio']
+    return {key: value for key, value in fresh.items() if value is not None}
 
-    # Slide a WINDOW_SIZE‐length window over s
-    for i in range(n - SILENCE_VALIDATION + 1):
-        window = s[i : i + SILENCE_VALIDATION]
-        if re.match(SILENCE_PATTERN, window):
-            indices.append(i)
 
-    return indices
+def clock_to_milliseconds(clock: str) -> int:
+    """
+    Parse a "HH:MM:SS:mmm" stopwatch string into milliseconds.
+    """
+    hours, minutes, seconds, milliseconds = (int(part) for part in clock.split(':'))
+    return hours * 3600000 + minutes * 60000 + seconds * 1000 + milliseconds
 
 
 def format_milliseconds(ms: int) -> str:
@@ -140,41 +238,62 @@ def format_milliseconds(ms: int) -> str:
 
 
 def markdown_breath(filename: str, autosplit: bool = True,
-                    get_ie_audio=False, get_ie_text=False, get_ar_audio=False, get_ar_text=False) -> tuple[list[dict], str]:
-    silence_transcription = transcribe_file(filename)
-    transcription = bt.transcript(filename)
+                    get_ie_audio=False, get_ie_text=False, get_ar_audio=False, get_ar_text=False,
+                    progress=None) -> tuple[list[dict], str]:
+    """
+    Splits a recording into breath phases by silence and predicts each phase.
+    `progress(done, total)` is called as segments are finished.
+    """
+    # decode at most once, every transcriber and segment below works on views of the same samples
+    key, decoded = file_cache(filename)
+    silence_transcription = cached_silence_transcript(key, decoded)
+    transcription = cached_transcript(key, decoded)
     silence_indices = find_silence_indices(silence_transcription)
     silence_indices = [0, *silence_indices]
     phase = ["inhale", "exhale"]
     breath_markdown = []
     if autosplit:
-
-        for i in range(len(silence_indices) - 1):
-            partial_transcription = transcription[silence_indices[i]:silence_indices[i+1]]
-            ie_predicted_audio, \
-            ie_predicted_text, \
-            activity_predicted_audio, \
-            activity_predicted_text = slice_and_get_params(filename, silence_indices[i] * CHUNK_LENGTH, silence_indices[i+1] * CHUNK_LENGTH,
-                                                            get_ie_audio=get_ie_audio, get_ie_text=get_ie_text,
-                                                            get_ar_audio=get_ar_audio, get_ar_text=get_ar_text,
-                                                            transcript=partial_transcription)
-            breath_markdown.append({"time": format_milliseconds(CHUNK_LENGTH * silence_indices[i]), 
-                                    "transcript": partial_transcription,
+        segments = list(zip(silence_indices[:-1], silence_indices[1:]))
+        partial_transcriptions = [transcription[start:end] for start, end in segments]
+        # text models run once over the whole batch of segment transcripts
+        ie_predicted_texts = predict_ie_text(partial_transcriptions) if get_ie_text else [None] * len(segments)
+        activity_predicted_texts = predict_activity_text(partial_transcriptions) if get_ar_text else [None] * len(segments)
+
+        # audio models run on the worker pool, segments are views into the decoded file
+        audio_modes = [mode for mode, enabled in ((get_breath_params.IE, get_ie_audio), (get_breath_params.AR, get_ar_audio)) if enabled]
+        audio_predictions = {}
+        if audio_modes:
+            pcm_data, rate = decoded()
+            segment_pcm = [pcm_data[pcm.ms_to_samples(start * CHUNK_LENGTH, rate):pcm.ms_to_samples(end * CHUNK_LENGTH, rate)]
+                           for start, end in segments]
+            on_segment = (lambda i: progress(i + 1, len(segments))) if progress is not None else None
+            audio_predictions = dict(zip(audio_modes, predict_audio(audio_modes, segment_pcm, rate, on_segment)))
+        ie_predicted_audios = audio_predictions.get(get_breath_params.IE, [None] * len(segments))
+        activity_predicted_audios = audio_predictions.get(get_breath_params.AR, [None] * len(segments))
+
+        for i, (start, end) in enumerate(segments):
+            breath_markdown.append({"time": format_milliseconds(CHUNK_LENGTH * start), 
+                                    "transcript": partial_transcriptions[i],
                                     "inhale_exhale": phase[i % 2],
-                                    'ie_predicted_text' : ie_predicted_text,
-                                    'ie_predicted_audio' : ie_predicted_audio,
+                                    'ie_predicted_text' : ie_predicted_texts[i],
+                                    'ie_predicted_audio' : ie_predicted_audios[i],
                                     'activity' : filename,
-                                    'activity_predicted_text' : activity_predicted_text,
-                                    'activity_predicted_audio' : activity_predicted_audio}) 
+                                    'activity_predicted_text' : activity_predicted_texts[i],
+                                    'activity_predicted_audio' : activity_predicted_audios[i]}) 
+            if progress is not None and not audio_modes:
+                progress(i + 1, len(segments))
     else:
         breath_markdown.append({"time": format_milliseconds(0), 
                                        "transcript": transcription,
                                        "inhale_exhale": "inhale"}) 
+        if progress is not None:
+            progress(1, 1)
     return breath_markdown, transcription
 
-def get_wav_duration(filepath: str) -> float:
-    audio = AudioSegment.from_wav(filepath)
-    duration_ms = len(audio)
+def get_wav_duration(filepath: str) -> int:
+    # header only, the samples are not decoded
+    info = sf.info(filepath)
+    duration_ms = round(info.frames * 1000 / info.samplerate)
     return duration_ms
 
 
@@ -187,36 +306,88 @@ app.config.update(
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 # app.secret_key = 'tempkey'
 
-socketio = SocketIO(app, async_mode='eventlet', cors_allowed_origins=['http://localhost:5173'])
+socketio = SocketIO(app, async_mode='eventlet', cors_allowed_origins=['http://localhost:5173'],
+                    message_queue=SOCKETIO_MESSAGE_QUEUE)
 
 
 @socketio.on('connect')
 def handle_connect():
     session['socket_id'] = request.sid
+    # chunks of this client arrive on this worker, so its decoder lives here
+    session_registry.claim(request.sid)
+
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    # the recording, transcript log and decoder of a client are not needed once it is gone
+    session_registry.remove(request.sid)
+
 
-from collections import defaultdict
-client_data = defaultdict(lambda: {"chunks": 0, 
-                                    "transcript": "",
-                                    "transcript_silence": "", 
-                                    "last_transcript_length": 0,
-                                    "autosplit": False,
-                                    "fileName": False,
-                                    "autoBreath": False,
-                                    "autoBreathByText": False,
-                                    "autoBreathByAudio": False,
-                                    "autoActivity": False,
-                                    "autoActivityByText": False,
-                                    "autoActivityByAudio": False,
-                                    "data_collect_filename": ""})
-
-
-ie_fingerprint_model = joblib.load(IE_MODEL_FILE)
-transcript_model = joblib.load(f"{MODELS_FOLDER}/model_transcript_breath.pkl")
+# Model and DSP calls of sockets and requests; only the calling green thread waits for them
+executor = Executor(EXECUTOR_KIND, EXECUTOR_WORKERS)
+
+# Text models; swapped atomically when their files change or the IE model is updated
+IE_MODEL = "ie_fingerprint"
+ACTIVITY_MODEL = "activity_transcript"
+model_registry = ModelRegistry(MODEL_RELOAD_INTERVAL, executor.run_in_process)
+model_registry.register(IE_MODEL, IE_MODEL_FILE)
+model_registry.register(ACTIVITY_MODEL, ACTIVITY_MODEL_FILE)
+if MODELS_PRELOAD:
+    socketio.start_background_task(model_registry.load_all)
 hash_vectorizer = HashingVectorizer(analyzer='char_wb', ngram_range=(3, 5), n_features=50)
+# Confirmed cuts, fitted in mini-batches in the background and checkpointed now and then
+online_learner = OnlineLearner(model_registry, hash_vectorizer.transform, ONLINE_LEARNING_BATCH,
+                               ONLINE_LEARNING_FLUSH_INTERVAL, ONLINE_LEARNING_CHECKPOINT_SAMPLES,
+                               ONLINE_LEARNING_CHECKPOINT_INTERVAL)
+
+# Transcripts and predictions shared by /transcript, /markdown, /inhale_exhale, /activity and /upload
+transcript_cache = TranscriptCache(f"PyBreathTranscript={package_version('PyBreathTranscript')};"
+                                   f"PyBreathParams={package_version('PyBreathParams')}",
+                                   TRANSCRIPT_CACHE_MEMORY_BYTES,
+                                   TRANSCRIPT_CACHE_FOLDER,
+                                   TRANSCRIPT_CACHE_DISK_BYTES)
+
+# Sessions and jobs shared by all workers (in process memory when there is only one)
+shared_store = open_store(SESSION_STORE_URL)
 
+# Background jobs (offline uploads); with a shared session store any worker can report on a job
+job_store = jobs.SharedJobStore(shared_store) if SESSION_STORE_URL else jobs.InMemoryJobStore()
+job_queue = jobs.JobQueue(job_store, socketio.start_background_task,
+                          notify=lambda event, payload, sid: socketio.emit(event, payload, room=sid))
 
-# File to which audio chunks are appended in binary mode.
+
+# Session files of older versions (the received webm and per-chunk WAVs), only deleted if still lying around;
+# the decoded audio is kept in the session's PCM log instead
 RECORDING_FILE_TEMPLATE = "recording_{sid}.webm"
+TEMP_CHUNK_FILE_TEMPLATE = "temp_chunk_{sid}.wav"
+
+# Live clients; idle sessions and files of sessions that are gone are swept in the background
+session_registry = sessions.SessionRegistry(SESSION_TTL, SESSION_TRANSCRIPT_TAIL, SESSION_SPILL_FOLDER,
+                                            files=(RECORDING_FILE_TEMPLATE, TEMP_CHUNK_FILE_TEMPLATE),
+                                            store=shared_store, worker_id=WORKER_ID)
+
+
+def owner_redirect(sid):
+    """
+    Redirect to the worker that owns the session's decoder and recording,
+    None if that is this worker (or there is only one).
+    """
+    owner = session_registry.owner(sid)
+    if owner is None or owner == WORKER_ID or not WORKER_URLS:
+        return None
+    query = request.query_string.decode()
+    # 307 keeps the method and the form, the client re-sends the request to the owner
+    return redirect(f"{WORKER_URLS[int(owner)]}{request.path}{'?' + query if query else ''}", code=307)
+
+
+def sweep_sessions():
+    while True:
+        for sid in session_registry.sweep():
+            print(f"Session {sid} expired")
+        socketio.sleep(SESSION_SWEEP_INTERVAL)
+
+
+socketio.start_background_task(sweep_sessions)
 
 # Ensure the recording file exists/starts empty.
 # with open(RECORDING_FILE, "wb") as f:
@@ -236,13 +407,29 @@ def index():
 @socketio.on('audio_chunk')
 def handle_audio_chunk(chunk):
     sid = request.sid
-    filename = RECORDING_FILE_TEMPLATE.format(sid=sid)
-    # ensure per-client recording file exists
-    with open(filename, "ab") as f:
-        f.write(chunk)
-    client_data[sid]["chunks"] += 1
-    # process in background to avoid blocking the event loop
-    bg_task = socketio.start_background_task(process_chunk, sid, filename)
+    # settings come with /start, the chunk path only needs the local session
+    client = session_registry.peek(sid) or session_registry.claim(sid)
+    client.last_seen = t.monotonic()
+    client.chunks += 1
+    # decode only the new bytes; every complete 200 ms frame is logged for /cut and queued for the session's worker
+    if client.decoder is None:
+        recording = session_registry.new_recording(client, RATE, 2, PCM_RING_SECONDS * 1000)
+        chunk_pipeline = pipeline.ChunkPipeline(lambda frame, depth, lag: process_chunk(sid, frame, depth, lag),
+                                                CHUNK_QUEUE_SIZE, CHUNK_QUEUE_POLICY,
+                                                on_drop=lambda count: drop_chunks(sid, count),
+                                                on_pressure=lambda slow_down: socketio.emit('slow_down', {'slow_down': slow_down}, room=sid))
+
+        def on_frame(index, frame):
+            recording.append(frame)
+            chunk_pipeline.put(index, frame)
+
+        client.pipeline = chunk_pipeline
+        client.decoder = StreamDecoder(on_frame, rate=RATE, channels=2, frame_ms=CHUNK_LENGTH)
+    client.decoder.feed(chunk)
+    return {'status': 'ok',
+            'queue': client.pipeline.depth,
+            'lag_ms': round(client.pipeline.lag * 1000),
+            'slow_down': client.pipeline.pressure}
         
 
         
@@ -275,47 +462,75 @@ def upload_file():
     sid = request.form.get('sid') or session.get('socket_id')
     if not sid:
         return jsonify({"error": "Session not initialized"}), 400
-    if request.method == "POST":
-        filename, \
-        autoBreath, autoBreathByText, autoBreathByAudio, \
-        autoActivity, autoActivityByText, autoActivityByAudio, \
-        autosplit = fetch_file_data(request, ["fileName",
-                                            "autoBreath",
-                                            "autoBreathByText",
-                                            "autoBreathByAudio",
-                                            "autoActivity",
-                                            "autoActivityByText",
-                                            "autoActivityByAudio",
-                                            "autoBreathMarkup",]) 
-        client_data[sid]["fileName"] = filename
-        client_data[sid]["autoBreath"] = str_to_bool(autoBreath)
-        client_data[sid]["autoBreathByText"] = str_to_bool(autoBreathByText)
-        client_data[sid]["autoBreathByAudio"] = str_to_bool(autoBreathByAudio)
-        client_data[sid]["autoActivity"] = str_to_bool(autoActivity)
-        client_data[sid]["autoActivityByText"] = str_to_bool(autoActivityByText)
-        client_data[sid]["autoActivityByAudio"] = str_to_bool(autoActivityByAudio)
-        client_data[sid]["autosplit"] = str_to_bool(autosplit)
-    try:
-        # Run transcription
-        breath_markdown, transcription = markdown_breath(file_path,
-                                                        client_data[sid]["autosplit"],
-                                                        client_data[sid]["autoBreathByAudio"],
-                                                        client_data[sid]["autoBreathByText"],
-                                                        client_data[sid]["autoActivityByAudio"],
-                                                        client_data[sid]["autoActivityByText"])
-
-        return jsonify({'filename': filename,
-                        'full_transcript': transcription,
-                        'duration': file_duration,
-                        'transcript': breath_markdown}), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    # only the settings are needed here, not a session on whichever worker took the upload
+    filename, \
+    autoBreath, autoBreathByText, autoBreathByAudio, \
+    autoActivity, autoActivityByText, autoActivityByAudio, \
+    autosplit = fetch_file_data(request, ["fileName",
+                                        "autoBreath",
+                                        "autoBreathByText",
+                                        "autoBreathByAudio",
+                                        "autoActivity",
+                                        "autoActivityByText",
+                                        "autoActivityByAudio",
+                                        "autoBreathMarkup",]) 
+    settings = {
+        'file_name': filename,
+        'auto_breath': str_to_bool(autoBreath),
+        'auto_breath_by_text': str_to_bool(autoBreathByText),
+        'auto_breath_by_audio': str_to_bool(autoBreathByAudio),
+        'auto_activity': str_to_bool(autoActivity),
+        'auto_activity_by_text': str_to_bool(autoActivityByText),
+        'auto_activity_by_audio': str_to_bool(autoActivityByAudio),
+        'autosplit': str_to_bool(autosplit),
+    }
+    session_registry.save_settings(sid, settings)
+    # Run transcription in the background, the result is fetched from /jobs/<job_id>
+    job_id = job_queue.submit(process_upload, file_path, filename, file_duration,
+                              settings['autosplit'],
+                              settings['auto_breath_by_audio'],
+                              settings['auto_breath_by_text'],
+                              settings['auto_activity_by_audio'],
+                              settings['auto_activity_by_text'],
+                              sid=sid)
+    return jsonify({'job_id': job_id}), 202
+
+
+def process_upload(file_path, filename, file_duration, autosplit,
+                   get_ie_audio, get_ie_text, get_ar_audio, get_ar_text, progress=None):
+    breath_markdown, transcription = markdown_breath(file_path, autosplit,
+                                                     get_ie_audio, get_ie_text,
+                                                     get_ar_audio, get_ar_text,
+                                                     progress=progress)
+    return {'filename': filename,
+            'full_transcript': transcription,
+            'duration': file_duration,
+            'transcript': breath_markdown}
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({'job_id': job_id,
+                    'status': job["status"],
+                    'done': job["done"],
+                    'total': job["total"],
+                    'result': job["result"],
+                    'error': job["error"]}), 200
     
 
 # ------------------
 # API CALLS
 # ------------------
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # gauges for monitoring: live sessions and the transcript bytes they hold, online learning
+    return jsonify({**session_registry.stats(), "online_learning": online_learner.stats()}), 200
+
+
 @app.route('/transcript', methods=['GET', 'POST'])
 def transcript():
     if request.method == "GET":
@@ -323,7 +538,7 @@ def transcript():
         if not filename:
             return jsonify({"error": "Filename parameter is missing"}), 400
         try:
-            result = bt.transcript(filename)
+            result = cached_transcript(*file_cache(filename))
             return jsonify({"filename": filename,
                             "transcript": result})
         except Exception as e:
@@ -356,12 +571,13 @@ def get_phase():
         if not method:
             method = "wave"
         try:
+            key, decoded = file_cache(filename)
             if method == "wave":
-                result = get_breath_params.predict(get_breath_params.IE, filename)
+                result = transcript_cache.get_or_compute(key, "ie:wave",
+                                                         lambda: executor.run(pcm.breath_params, get_breath_params.IE, *decoded()))
             elif method == "transcript":
-                transcript = bt.transcript(filename)
-                prediction = int(ie_fingerprint_model.predict(hash_vectorizer.fit_transform([transcript]))[0])
-                result = 'exhale' if prediction == 1 else 'inhale'
+                result = transcript_cache.get_or_compute(key, f"ie:transcript:{model_version(IE_MODEL)}",
+                                                         lambda: predict_ie_text([cached_transcript(key, decoded)])[0])
             else:
                 return jsonify({"error": "Invalid method parameter"}), 400
             return jsonify({"filename": filename,
@@ -382,12 +598,13 @@ def get_activity():
         if not method:
             method = "wave"
         try:
+            key, decoded = file_cache(filename)
             if method == "wave":
-                result = get_breath_params.predict(get_breath_params.AR, filename)
+                result = transcript_cache.get_or_compute(key, "activity:wave",
+                                                         lambda: executor.run(pcm.breath_params, get_breath_params.AR, *decoded()))
             elif method == "transcript":
-                transcript = bt.transcript(filename)
-                detected_activity_cluster = int(transcript_model.predict(hash_vectorizer.fit_transform([transcript]))[0])
-                result = 'active' if detected_activity_cluster == 2 else 'resting' # if detected_activity_cluster == 1 else 'Other'
+                result = transcript_cache.get_or_compute(key, f"activity:transcript:{model_version(ACTIVITY_MODEL)}",
+                                                         lambda: predict_activity_text([cached_transcript(key, decoded)])[0])
             else:
                 return jsonify({"error": "Invalid method parameter"}), 400
             return jsonify({"filename": filename,
@@ -412,6 +629,10 @@ def get_start_params():
     sid = request.form.get('sid') or session.get('socket_id')
     if not sid:
         return jsonify({"error": "Session not initialized"}), 400
+    redirected = owner_redirect(sid)
+    if redirected is not None:
+        return redirected
+    client = session_registry.get(sid)
     if request.method == "POST":
         filename, \
         autoBreath, autoBreathByText, autoBreathByAudio, \
@@ -424,20 +645,23 @@ def get_start_params():
                                             "autoActivityByText",
                                             "autoActivityByAudio",
                                             "autoBreathMarkup",]) 
-        client_data[sid]["fileName"] = filename
-        client_data[sid]["autoBreath"] = str_to_bool(autoBreath)
-        client_data[sid]["autoBreathByText"] = str_to_bool(autoBreathByText)
-        client_data[sid]["autoBreathByAudio"] = str_to_bool(autoBreathByAudio)
-        client_data[sid]["autoActivity"] = str_to_bool(autoActivity)
-        client_data[sid]["autoActivityByText"] = str_to_bool(autoActivityByText)
-        client_data[sid]["autoActivityByAudio"] = str_to_bool(autoActivityByAudio)
-        client_data[sid]["autosplit"] = str_to_bool(autosplit)
+        client.file_name = filename
+        client.auto_breath = str_to_bool(autoBreath)
+        client.auto_breath_by_text = str_to_bool(autoBreathByText)
+        client.auto_breath_by_audio = str_to_bool(autoBreathByAudio)
+        client.auto_activity = str_to_bool(autoActivity)
+        client.auto_activity_by_text = str_to_bool(autoActivityByText)
+        client.auto_activity_by_audio = str_to_bool(autoActivityByAudio)
+        client.autosplit = str_to_bool(autosplit)
+        # a new recording is a new webm stream, so it needs a fresh decoder
+        client.close_decoder()
         if APP_MODE == DATA_COLLECT_MODE:
             # Find the next filename based on existing files in the upload folder
             existing_files = [f for f in os.listdir(f"{UPLOAD_FOLDER}/active") if f.endswith(".wav")]
             numbers = [int(re.match(r"(\d{4})\.wav", f).group(1)) for f in existing_files if re.match(r"\d{4}\.wav", f)]
             next_number = max(numbers) + 1 if numbers else 1
-            client_data[sid]["data_collect_filename"] = f"{next_number:04d}"
+            client.data_collect_filename = f"{next_number:04d}"
+        session_registry.save(client)
 
         return jsonify({"status": "success"}), 200
     
@@ -456,80 +680,78 @@ def cut_phase():
     sid = request.form.get('sid') or session.get('socket_id')
     if not sid:
         return jsonify({"error": "Session not initialized"}), 400
+    redirected = owner_redirect(sid)
+    if redirected is not None:
+        return redirected
+    client = session_registry.get(sid)
     if request.method == "POST":
         current_step, time = fetch_file_data(request, [
                                                         "current_step", 
                                                         "last_time", 
                                                         ])
-        update = False # TODO: add button to site & fetch in /start
-        prefix = client_data[sid]["fileName"]
+        prefix = client.file_name
         ie_predicted_text = None
         ie_predicted_audio = None
         activity_predicted_text = None
         activity_predicted_audio = None
 
         # print(prefix)
-        filename = "temp.webm"
-        # filename = request.files["prefix"] + "/" + filename
-        shutil.copy(RECORDING_FILE_TEMPLATE.format(sid=sid), filename)
+        # the phase since the previous cut, sliced from the session's own decoded audio:
+        # no decode, no temp files, nothing shared with other sessions
+        cutout = clock_to_milliseconds(time)
+        previous_cut_ms = client.last_cut_ms
+        segment = cut_segment(client, cutout)
+        # the audio predictions the live ones already made for this phase aren't made again
+        live = fresh_live_predictions(client, previous_cut_ms, cutout)
+        client.live = None
 
         if APP_MODE == DEV_MODE:
-            # change codec
             if not os.path.exists(f'{UPLOAD_FOLDER}/{prefix}'):
                 os.makedirs(f'{UPLOAD_FOLDER}/{prefix}')
                 os.makedirs(f'{UPLOAD_FOLDER}/{prefix}/{AUDIO_FOLDER}')
                 os.makedirs(f'{UPLOAD_FOLDER}/{prefix}/{GRAPH_FOLDER}')
 
-            if not client_data[sid]["autoBreath"]:
+            if not client.auto_breath:
                 output_filename = f'{UPLOAD_FOLDER}/{prefix}/{AUDIO_FOLDER}/{prefix}_{current_step}_{time}.wav'
-            else:
-                output_filename = 'temp_proccessed.wav'
-                
-            time_split = time.split(':')
-            cutout = int(time_split[0]) * 3600 * 1000 + int(time_split[1]) * 60 * 1000 + int(time_split[2]) * 1000 + int(time_split[3])
-            subprocess.run([
-                "ffmpeg", "-y", "-fflags", "+genpts", "-ss", str(cutout / 1000), "-i", filename, "-ar", "44100", "-ac", "2", "-f", "wav", output_filename
-            ])
+                pcm.write_wav(output_filename, segment, RATE)
 
             recording_time = t.strftime('%d.%m.%Y %X')
 
             if CUTTING_MODE == CUT_FILE:
-                transcript = bt.transcript(output_filename, bt.FINGERPRINT)
+                transcript = executor.run(pcm.transcript, segment, RATE, bt.FINGERPRINT)
+                text_features = features.transform([transcript])
             elif CUTTING_MODE == CUT_LETTERS:
-                full_transcript = client_data[sid]["transcript"]
-                last_length = client_data[sid].get("last_transcript_length", 0)
-                transcript = full_transcript[last_length:]
-                client_data[sid]["last_transcript_length"] = len(full_transcript)
+                # without the chunks dropped under load, like the features
+                transcript = client.transcript.since(client.last_transcript_length).replace(DROPPED_SYMBOL, "")
+                client.last_transcript_length = len(client.transcript)
+                # kept up to date symbol by symbol, nothing to featurize here
+                text_features = client.features.vector()
+                client.features.reset()
 
             # Inhale/Exhale detection
-            if client_data[sid]["autoBreath"]:
+            if client.auto_breath:
                 # Text-based prediction
-                if client_data[sid]["autoBreathByText"]:
-                    prediction = int(ie_fingerprint_model.predict(hash_vectorizer.fit_transform([transcript]))[0])
-                    print(f"Predicted class: {prediction}")
-                    ie_predicted_text = 'exhale' if prediction == 1 else 'inhale'
+                if client.auto_breath_by_text:
+                    ie_predicted_text = predict_ie_features(text_features)[0]
+                    print(f"Predicted class: {ie_predicted_text}")
                     final_output_filename = f'{UPLOAD_FOLDER}/{prefix}/{AUDIO_FOLDER}/{prefix}_{ie_predicted_text}_{recording_time}.wav'
-                    shutil.copyfile(output_filename, final_output_filename)
+                    pcm.write_wav(final_output_filename, segment, RATE)
                 # Audio-based prediction
-                if client_data[sid]["autoBreathByAudio"]:
-                    ie_predicted_audio = get_breath_params.predict(get_breath_params.IE, output_filename)
+                if client.auto_breath_by_audio and len(segment):
+                    ie_predicted_audio = live.get('ie_predicted_audio') or executor.run(pcm.breath_params, get_breath_params.IE, segment, RATE)
             
-                # Update model
-                if update:
-                    if current_step == ie_predicted_text:
-                        ie_fingerprint_model.partial_fit(hash_vectorizer.fit_transform([transcript]))
-                        with open(IE_MODEL_FILE, 'wb') as f:
-                            joblib.dump(ie_fingerprint_model, f)  
+                # Update model: the cut confirms the prediction, learned with the next mini-batch
+                if ONLINE_LEARNING and current_step == ie_predicted_text:
+                    online_learner.add(IE_MODEL, transcript, current_step)
 
             # Activity detection
-            if client_data[sid]["autoActivity"]:
+            if client.auto_activity:
                 # Text-based prediction
-                if client_data[sid]["autoActivityByText"]:
-                    detected_activity_cluster = int(transcript_model.predict(hash_vectorizer.fit_transform([transcript]))[0])
-                    activity_predicted_text = 'active' if detected_activity_cluster == 2 else 'resting' # if detected_activity_cluster == 1 else 'Other'
+                if client.auto_activity_by_text:
+                    activity_predicted_text = predict_activity_features(text_features)[0]
                 # Audio-based prediction
-                if client_data[sid]["autoActivityByAudio"]:
-                    activity_predicted_audio = get_breath_params.predict(get_breath_params.AR, output_filename)
+                if client.auto_activity_by_audio and len(segment):
+                    activity_predicted_audio = live.get('activity_predicted_audio') or executor.run(pcm.breath_params, get_breath_params.AR, segment, RATE)
             # transcript_prefix = f'{prefix} {current_step} {starting_point}: '
 
             # create graph
@@ -537,16 +759,12 @@ def cut_phase():
             # create_waveform.create_waveform(output_filename, transcript, graph_path)
 
         elif APP_MODE == DATA_COLLECT_MODE:
-            output_filename = f'{UPLOAD_FOLDER}/active/{client_data[sid]["data_collect_filename"]}.wav'
-            time_split = time.split(':')
-            cutout = int(time_split[0]) * 3600 * 1000 + int(time_split[1]) * 60 * 1000 + int(time_split[2]) * 1000 + int(time_split[3])
-
-            subprocess.run([
-                "ffmpeg", "-y", "-fflags", "+genpts", "-ss", str(cutout / 1000), "-i", filename, "-ar", "44100", "-ac", "2", "-f", "wav", output_filename
-            ])
+            output_filename = f'{UPLOAD_FOLDER}/active/{client.data_collect_filename}.wav'
+            pcm.write_wav(output_filename, segment, RATE)
 
-            next_number = int(client_data[sid]["data_collect_filename"]) + 1
-            client_data[sid]["data_collect_filename"] = f"{next_number:04d}"
+            next_number = int(client.data_collect_filename) + 1
+            client.data_collect_filename = f"{next_number:04d}"
+            session_registry.save(client)
 
 
 
@@ -573,24 +791,56 @@ def remove_file():
     sid = request.form.get('sid') or session.get('socket_id')
     if not sid:
         return jsonify({"error": "Session not initialized"}), 400
+    redirected = owner_redirect(sid)
+    if redirected is not None:
+        return redirected
     if request.method == "POST":
         prefix = request.form.get("prefix")
         recording_time = t.strftime('%d.%m.%Y_%H.%M.%S')
         try:
-            filename = RECORDING_FILE_TEMPLATE.format(sid=sid)
-            if os.path.exists(filename):
+            client = session_registry.get(sid)
+            client.close_decoder()
+            # the recording is finished: the response and the archive take it over
+            recording, client.recording = client.recording, None
+            if recording is not None and recording.samples:
                 final_filename = os.path.abspath(f'{UPLOAD_FOLDER}/{prefix}/{AUDIO_FOLDER}/{prefix}_full_{recording_time}.wav')
-                subprocess.run([
-                    "ffmpeg", "-y", "-fflags", "+genpts", "-i", filename, "-ar", "44100", "-ac", "2", "-f", "wav", final_filename
-                    ])
-                os.remove(filename)
-                return send_file(final_filename, mimetype='audio/wav', as_attachment=True)
+                return stream_recording(recording, final_filename)
             else:
                 return jsonify({"message": "File not found"}), 404
         except Exception as e:
             return jsonify({"message": f"Error deleting file: {str(e)}"}), 500
     
 
+def stream_recording(recording, archive_path: str) -> Response:
+    """
+    WAV response of a finished live recording, sent as the header followed by the decoded
+    samples straight from the session's PCM log; the same bytes are written to `archive_path`
+    in the background. Nothing waits for a transcode and nothing holds the whole recording.
+    """
+    header = pcm.wav_header(recording.disk_bytes, recording.rate, recording.channels)
+    response_blocks = recording.stream()
+    archive_blocks = recording.stream()
+    # both readers are open, the log itself can go
+    recording.close()
+    socketio.start_background_task(write_archive, archive_path, header, archive_blocks)
+
+    def generate():
+        yield header
+        yield from response_blocks
+
+    return Response(generate(), mimetype='audio/wav', direct_passthrough=True,
+                    headers={'Content-Disposition': f'attachment; filename="{os.path.basename(archive_path)}"',
+                             'Content-Length': str(len(header) + recording.disk_bytes)})
+
+
+def write_archive(path: str, header: bytes, blocks):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(header)
+        for block in blocks:
+            f.write(block)
+
+
 # @app.route('/create_csv', methods=['GET', 'POST'])
 # def create_csv():
 #     if request.method == "POST":
@@ -598,38 +848,114 @@ def remove_file():
 #         print(data)
 #         return data
 
-def process_chunk(sid, filename):
-    # convert to wav
-    chunk_output = f"temp_chunk_{sid}.wav"
-    subprocess.run([
-        "ffmpeg", "-y", "-fflags", "+genpts",
-        "-i", filename, "-ar", "44100", "-ac", "2", "-f", "wav", chunk_output
-    ])
-    audio = AudioSegment.from_wav(chunk_output)
-    chunk_index = client_data[sid]["chunks"] - 1
-    audio = audio[CHUNK_LENGTH*chunk_index : CHUNK_LENGTH*(chunk_index+1)]
-    audio.export(chunk_output, format='wav')
-
-    # Run both transcription algorithms concurrently using eventlet
-    silence_checker = eventlet.spawn(get_recognizer().process_chunk, audio, RATE)
-    audio_fingerprint = eventlet.spawn(bt.transcript_chunk, chunk_output, bt.WAVEFORM)
+def process_chunk(sid, frame, depth, lag):
+    client = session_registry.peek(sid)
+    if client is None:
+        # the client is gone, the decoder is only draining
+        return
+    # already decoded audio, no need to re-read the recording or touch the disk;
+    # a coalesced frame covers frame.count chunks and gets one symbol per chunk
+
+    # Run both transcription algorithms concurrently on the executor, off the eventlet hub
+    # silence per chunk, so one silent chunk of a coalesced frame doesn't count as several
+    silence_checker = executor.spawn(pcm.silence_symbols, frame.pcm, RATE, frame.count)
+    audio_fingerprint = executor.spawn(pcm.transcript_chunk, frame.pcm, RATE, bt.WAVEFORM)
 
     # Wait for both to finish
-    silence_symbol = silence_checker.wait()
+    silence_symbols = silence_checker.wait()
     transcript_symbol = audio_fingerprint.wait()
 
-    client_data[sid]["transcript_silence"] += silence_symbol
-    client_data[sid]["transcript"] += transcript_symbol
+    record_symbols(sid, client, silence_symbols, transcript_symbol * frame.count, depth, lag)
+
+    if (client.auto_breath or client.auto_activity) and live_prediction_due(sid, frame) and not client.live_pending:
+        # off the pipeline worker, so the next chunk is transcribed meanwhile
+        client.live_pending = True
+        socketio.start_background_task(predict_live, sid, client)
+
+
+def live_prediction_due(sid, frame) -> bool:
+    """
+    Every LIVE_PREDICTION_CHUNKS chunks; each session is offset by its sid,
+    so the predictions of sessions that started together don't all land on the same chunk.
+    """
+    if LIVE_PREDICTION_CHUNKS <= 0:
+        return False
+    start = frame.index + zlib.crc32(sid.encode()) % LIVE_PREDICTION_CHUNKS
+    # a coalesced frame covers frame.count chunks
+    return (start + frame.count) // LIVE_PREDICTION_CHUNKS > start // LIVE_PREDICTION_CHUNKS
+
+
+def predict_live(sid, client):
+    """
+    Inhale/exhale and activity of the phase since the last cut, emitted as 'live_prediction'.
+    Text predictions use the session's running transcript features, audio predictions
+    the last LIVE_PREDICTION_WINDOW seconds of decoded audio since the cut.
+    """
+    try:
+        recording = client.recording
+        text_features = client.features.vector()
+        live = {
+            'since_ms': client.last_cut_ms,
+            'end_ms': recording.duration_ms if recording is not None else 0,
+            'ie_predicted_text': None,
+            'ie_predicted_audio': None,
+            'activity_predicted_text': None,
+            'activity_predicted_audio': None,
+        }
+        live['start_ms'] = max(live['since_ms'], live['end_ms'] - int(LIVE_PREDICTION_WINDOW * 1000))
+        by_audio = (client.auto_breath and client.auto_breath_by_audio) or (client.auto_activity and client.auto_activity_by_audio)
+        segment = recording.read(live['start_ms'], live['end_ms']) if by_audio and recording is not None else ()
+
+        if client.auto_breath:
+            if client.auto_breath_by_text:
+                live['ie_predicted_text'] = predict_ie_features(text_features)[0]
+            if client.auto_breath_by_audio and len(segment):
+                live['ie_predicted_audio'] = executor.run(pcm.breath_params, get_breath_params.IE, segment, RATE)
+        if client.auto_activity:
+            if client.auto_activity_by_text:
+                live['activity_predicted_text'] = predict_activity_features(text_features)[0]
+            if client.auto_activity_by_audio and len(segment):
+                live['activity_predicted_audio'] = executor.run(pcm.breath_params, get_breath_params.AR, segment, RATE)
+
+        client.live = live
+        socketio.emit('live_prediction', live, room=sid)
+    except Exception as e:
+        print(f"Live prediction for {sid} failed: {e}")
+    finally:
+        client.live_pending = False
+
+
+def drop_chunks(sid, count):
+    client = session_registry.peek(sid)
+    if client is None:
+        return
+    # keep the transcript aligned with the recording time, "?" marks chunks that were not transcribed
+    record_symbols(sid, client, DROPPED_SYMBOL * count, DROPPED_SYMBOL * count,
+                   client.pipeline.depth if client.pipeline is not None else 0, 0, dropped=True)
+
+
+def record_symbols(sid, client, silence_symbols, transcript_symbols, depth, lag, dropped=False):
+    if client.silence is None:
+        client.silence = silence.SilenceDetector(LETTERS_BEFORE_SILENCE, SILENCE_LENGTH)
+    client.transcript.append(transcript_symbols)
+    if dropped:
+        # nothing is known about dropped chunks: no breath boundary and no text for the models
+        client.silence.skip(len(silence_symbols))
+        silence_starts = []
+    else:
+        silence_starts = client.silence.feed(silence_symbols)
+        client.features.append(transcript_symbols)
     # emit back to the same client only
-    socketio.emit('transcription_result', {'letter': transcript_symbol}, room=sid)
-    if client_data[sid]["autosplit"]:
-        if len(client_data[sid]["transcript_silence"]) > SILENCE_VALIDATION:
-            silence_check = client_data[sid]["transcript_silence"][-SILENCE_VALIDATION:]
-            if re.match(SILENCE_PATTERN, silence_check):
-                print("SILENCE DETECTED")
-                socketio.emit('silence', {'silence': True}, room=sid)
+    socketio.emit('transcription_result', {'letter': transcript_symbols,
+                                           'queue': depth,
+                                           'lag_ms': round(lag * 1000)}, room=sid)
+    if client.autosplit:
+        # a silence right at the start of the recording is not a breath boundary
+        if any(start > 0 for start in silence_starts):
+            print("SILENCE DETECTED")
+            socketio.emit('silence', {'silence': True}, room=sid)
 
 
 if __name__ == "__main__":
     # app.secret_key = os.urandom(30).hex()
-    socketio.run(app, host='0.0.0.0', port='5001', debug=True)
+    socketio.run(app, host=HOST, port=PORT, debug=True)
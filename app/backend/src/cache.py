@@ -0,0 +1,135 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+
+_MISSING = object()
+FILE_HASHES = 4096  # remembered file content hashes, a few hundred KB
+
+
+class TranscriptCache:
+    '''
+    Content-addressed cache for transcripts and predictions of audio files.
+
+    Entries are keyed by the SHA-256 of the file content plus `version` (the transcriber
+    and model versions), so the same recording is only processed once whichever endpoint
+    asks for it. A memory tier is kept in LRU order and bounded by `max_memory_bytes`;
+    if `folder` is set, entries are also pickled to disk and the least recently used files
+    are removed once they take more than `max_disk_bytes`.
+    '''
+
+    def __init__(self, version: str, max_memory_bytes: int, folder: str | None = None, max_disk_bytes: int = 0):
+        self.version = version
+        self.max_memory_bytes = max_memory_bytes
+        self.folder = folder
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self._memory = OrderedDict()
+        self._hashes = OrderedDict()  # LRU, at most FILE_HASHES
+        self._lock = threading.Lock()
+        if folder is not None:
+            os.makedirs(folder, exist_ok=True)
+            self.disk_bytes = sum(entry.stat().st_size for entry in os.scandir(folder) if entry.name.endswith(".pkl"))
+
+    def file_key(self, path: str, run=None) -> str:
+        '''
+        Content hash of the file, re-computed only when its size or mtime changes.
+        The hashing itself is done by `run(fn, *args)` if given, e.g. an executor
+        '''
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(signature)
+            if digest is not None:
+                self._hashes.move_to_end(signature)
+        if digest is None:
+            digest = run(file_digest, path) if run is not None else file_digest(path)
+            with self._lock:
+                self._hashes[signature] = digest
+                while len(self._hashes) > FILE_HASHES:
+                    self._hashes.popitem(last=False)
+        return f"{digest}-{hashlib.sha256(self.version.encode()).hexdigest()[:16]}"
+
+    def get(self, key: str, field: str, default=None):
+        entry = (key, field)
+        with self._lock:
+            if entry in self._memory:
+                self._memory.move_to_end(entry)
+                return self._memory[entry][0]
+        if self.folder is None:
+            return default
+        path = self._disk_path(key, field)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return default
+        value = pickle.loads(data)
+        self._remember(entry, value, len(data))
+        return value
+
+    def put(self, key: str, field: str, value):
+        data = pickle.dumps(value)
+        self._remember((key, field), value, len(data))
+        if self.folder is not None:
+            self._write(key, field, data)
+
+    def get_or_compute(self, key: str, field: str, compute):
+        value = self.get(key, field, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, field, value)
+        return value
+
+    def _remember(self, entry, value, size: int):
+        with self._lock:
+            if entry in self._memory:
+                self.memory_bytes -= self._memory.pop(entry)[1]
+            self._memory[entry] = (value, size)
+            self.memory_bytes += size
+            while self.memory_bytes > self.max_memory_bytes and self._memory:
+                self.memory_bytes -= self._memory.popitem(last=False)[1][1]
+
+    def _disk_path(self, key: str, field: str) -> str:
+        return os.path.join(self.folder, f"{key}.{field.replace(':', '_').replace('/', '_')}.pkl")
+
+    def _write(self, key: str, field: str, data: bytes):
+        path = self._disk_path(key, field)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            if os.path.exists(path):
+                self.disk_bytes -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self.disk_bytes += len(data)
+            if self.disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        entries = sorted((entry for entry in os.scandir(self.folder) if entry.name.endswith(".pkl")),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self.disk_bytes <= self.max_disk_bytes:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self.disk_bytes -= size
+
+
+def file_digest(path: str) -> str:
+    '''
+    SHA-256 of a file's content, read in 1 MB blocks
+    '''
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
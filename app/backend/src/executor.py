@@ -0,0 +1,52 @@
+import eventlet
+from eventlet import tpool
+
+from src import workers
+
+
+THREAD = "thread"
+PROCESS = "process"
+INLINE = "inline"
+KINDS = (THREAD, PROCESS, INLINE)
+
+
+class Executor:
+    '''
+    Runs CPU-bound model and DSP calls off the eventlet hub.
+
+    Only the calling green thread waits for the result, every other socket keeps being served:
+      THREAD  – eventlet's tpool of real OS threads; NumPy/SciPy code releases the GIL there
+      PROCESS – the shared process pool, for pure-Python work such as the DTW recognizer;
+                functions and arguments have to be picklable
+      INLINE  – on the hub itself, as before (debugging)
+    '''
+
+    def __init__(self, kind: str = THREAD, workers_count: int = 4):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown executor kind {kind!r}, expected one of {KINDS}")
+        self.kind = kind
+        self.workers = workers_count
+        if kind == THREAD:
+            tpool.set_num_threads(workers_count)
+
+    def run(self, fn, *args):
+        if self.kind == THREAD:
+            return tpool.execute(fn, *args)
+        if self.kind == PROCESS:
+            # the pool's result thread is green after monkey_patch, so this only parks the caller
+            return workers.get_pool(self.workers).submit(fn, *args).result()
+        return fn(*args)
+
+    def run_in_process(self, fn, *args):
+        '''
+        Like `run`, but never in another process, for results that have to live in this one (models)
+        '''
+        if self.kind == PROCESS:
+            return tpool.execute(fn, *args)
+        return self.run(fn, *args)
+
+    def spawn(self, fn, *args) -> eventlet.greenthread.GreenThread:
+        '''
+        Starts fn(*args) on the executor and returns right away; `.wait()` gives the result
+        '''
+        return eventlet.spawn(self.run, fn, *args)
@@ -0,0 +1,106 @@
+from functools import lru_cache
+
+import numpy as np
+from sklearn.utils import murmurhash3_32
+
+
+NGRAM_RANGE = (3, 5)
+N_FEATURES = 50
+
+
+@lru_cache(maxsize=65536)
+def _hashed(ngram: str, n_features: int) -> tuple[int, float]:
+    # transcripts use a handful of symbols, so the few distinct n-grams are hashed once per process
+    h = murmurhash3_32(ngram, seed=0)
+    return abs(h) % n_features, 1.0 if h >= 0 else -1.0
+
+
+class NgramFeatures:
+    '''
+    Running hashed character n-gram counts of a growing transcript.
+
+    Gives the same vector as HashingVectorizer(analyzer='char_wb', ngram_range=NGRAM_RANGE,
+    n_features=N_FEATURES).transform([text]) for everything appended so far, but appending
+    costs O(1) per symbol instead of featurizing the whole text again.
+
+    char_wb pads each word with a space on both sides. The n-grams that end before a word's
+    last symbol can no longer change and are added to `counts` right away. Only the ones that
+    end with the closing pad depend on the word's last symbols, and are added in `vector()`
+    (or when the word ends).
+    '''
+
+    __slots__ = ("ngram_range", "n_features", "counts", "length", "_word", "_word_length")
+
+    def __init__(self, ngram_range: tuple[int, int] = NGRAM_RANGE, n_features: int = N_FEATURES):
+        if ngram_range[0] < 2 or ngram_range[1] < ngram_range[0]:
+            raise ValueError(f"Unsupported ngram_range {ngram_range}, n-grams need at least 2 symbols")
+        self.ngram_range = ngram_range
+        self.n_features = n_features
+        self.counts = np.zeros(n_features)
+        self.length = 0
+        self._word = " "  # the open word with its leading pad, only the last max_n - 1 symbols are kept
+        self._word_length = 0
+
+    def append(self, text: str):
+        min_n, max_n = self.ngram_range
+        for symbol in text.lower():
+            if symbol.isspace():
+                self._close_word()
+                continue
+            word = self._word + symbol
+            self._word_length += 1
+            for n in range(min_n, max_n + 1):
+                if len(word) >= n:
+                    self._add(word[-n:])
+            self._word = word[1 - max_n:]
+        self.length += len(text)
+
+    def reset(self):
+        self.counts[:] = 0
+        self.length = 0
+        self._word = " "
+        self._word_length = 0
+
+    def vector(self) -> np.ndarray:
+        '''
+        l2-normalized features of the text appended so far, shape (1, n_features)
+        '''
+        counts = self.counts.copy()
+        if self._word_length:
+            for index, sign in self._closing_ngrams():
+                counts[index] += sign
+        norm = np.linalg.norm(counts)
+        if norm > 0:
+            counts /= norm
+        return counts.reshape(1, -1)
+
+    def _close_word(self):
+        if self._word_length:
+            for index, sign in self._closing_ngrams():
+                self.counts[index] += sign
+        self._word = " "
+        self._word_length = 0
+
+    def _closing_ngrams(self):
+        # char_wb counts a padded word that is not longer than n once, as the n-gram of the
+        # smallest such n, and no larger n-grams at all
+        min_n, max_n = self.ngram_range
+        last_n = min(max_n, max(min_n, self._word_length + 2))
+        return [_hashed(self._word[1 - n:] + " ", self.n_features) for n in range(min_n, last_n + 1)]
+
+    def _add(self, ngram: str):
+        index, sign = _hashed(ngram, self.n_features)
+        self.counts[index] += sign
+
+
+def transform(texts, ngram_range: tuple[int, int] = NGRAM_RANGE, n_features: int = N_FEATURES) -> np.ndarray:
+    '''
+    Dense equivalent of HashingVectorizer.transform for the char_wb analyzer
+    '''
+    rows = np.zeros((len(texts), n_features))
+    features = NgramFeatures(ngram_range, n_features)
+    for i, text in enumerate(texts):
+        features.reset()
+        features.append(text)
+        rows[i] = features.vector()[0]
+    return rows
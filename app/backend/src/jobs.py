@@ -0,0 +1,121 @@
+import json
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class InMemoryJobStore:
+    '''
+    Job records kept in process memory. Only the newest `max_jobs` records are retained.
+
+    Any object with the same create/update/get methods can be passed to JobQueue instead,
+    e.g. a shared store for several workers or a stand-in in tests.
+    '''
+
+    def __init__(self, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, record: dict):
+        with self._lock:
+            self._jobs[job_id] = record
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record) if record is not None else None
+
+
+class SharedJobStore:
+    '''
+    Job records kept in the shared store (see src.store), so a job can be polled on any worker.
+    Records expire `ttl` seconds after their last update.
+    '''
+
+    def __init__(self, store, ttl: float = 24 * 60 * 60):
+        self.store = store
+        self.ttl = int(math.ceil(ttl))  # Redis EXPIRE takes whole seconds only
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, record: dict):
+        self._put(job_id, record)
+
+    def update(self, job_id: str, **fields):
+        # updates of one job come from the worker running it, the lock keeps them in order there
+        with self._lock:
+            record = self.get(job_id)
+            if record is not None:
+                record.update(fields)
+                self._put(job_id, record)
+
+    def get(self, job_id: str) -> dict | None:
+        record = self.store.hget(f"job:{job_id}", "record")
+        return json.loads(record) if record is not None else None
+
+    def _put(self, job_id: str, record: dict):
+        self.store.hset(f"job:{job_id}", "record", json.dumps(record))
+        self.store.expire(f"job:{job_id}", self.ttl)
+
+
+class JobQueue:
+    '''
+    Runs long jobs in the background and keeps their state in a job store.
+
+    `spawn(fn, *args)` starts a background task (socketio.start_background_task),
+    `notify(event, payload, sid)` pushes progress to the client that submitted the job.
+    '''
+
+    def __init__(self, store, spawn, notify=None):
+        self.store = store
+        self.spawn = spawn
+        self.notify = notify
+
+    def submit(self, fn, *args, sid=None) -> str:
+        '''
+        Queues fn(*args, progress=callback) and returns the job id right away
+        '''
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, {"id": job_id,
+                                   "sid": sid,
+                                   "status": PENDING,
+                                   "done": 0,
+                                   "total": None,
+                                   "result": None,
+                                   "error": None,
+                                   "created": time.time()})
+        self.spawn(self._run, job_id, sid, fn, args)
+        return job_id
+
+    def _run(self, job_id, sid, fn, args):
+        self.store.update(job_id, status=RUNNING)
+
+        def progress(done, total):
+            self.store.update(job_id, done=done, total=total)
+            self._notify('job_progress', {'job_id': job_id, 'done': done, 'total': total}, sid)
+
+        try:
+            result = fn(*args, progress=progress)
+            self.store.update(job_id, status=DONE, result=result)
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, error=str(e))
+        self._notify('job_finished', {'job_id': job_id, 'status': self.store.get(job_id)["status"]}, sid)
+
+    def _notify(self, event, payload, sid):
+        if self.notify is not None and sid:
+            self.notify(event, payload, sid)
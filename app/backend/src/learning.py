@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import defaultdict
+
+
+class OnlineLearner:
+    '''
+    Continual learning for registry models from confirmed live cuts.
+
+    Labeled samples are buffered per model and fitted by one background thread with a single
+    `partial_fit` per mini-batch (`batch_size` samples, or whatever is buffered after
+    `flush_interval` seconds). Every fit goes through ModelRegistry.update, so requests keep
+    predicting with the previous model until the fitted copy is swapped in. The model is saved
+    to disk after `checkpoint_samples` fitted samples or every `checkpoint_interval` seconds,
+    not after every cut.
+    '''
+
+    def __init__(self, registry, featurize, batch_size: int = 16, flush_interval: float = 60.0,
+                 checkpoint_samples: int = 256, checkpoint_interval: float = 600.0):
+        self.registry = registry
+        self.featurize = featurize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.checkpoint_samples = checkpoint_samples
+        self.checkpoint_interval = checkpoint_interval
+        self.fitted = defaultdict(int)
+        self.checkpoints = defaultdict(int)
+        self._buffers = defaultdict(list)
+        self._buffered_at = {}
+        self._unsaved = defaultdict(int)
+        self._saved_at = defaultdict(time.monotonic)
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def add(self, name: str, transcript: str, label: str):
+        with self._cond:
+            if not self._buffers[name]:
+                self._buffered_at[name] = time.monotonic()
+            self._buffers[name].append((transcript, label))
+            if len(self._buffers[name]) >= self.batch_size:
+                self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {name: {"buffered": len(self._buffers[name]),
+                           "fitted": self.fitted[name],
+                           "unsaved": self._unsaved[name],
+                           "checkpoints": self.checkpoints[name]}
+                    for name in set(self._buffers) | set(self.fitted)}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait(timeout=1.0)
+                now = time.monotonic()
+                batches = {}
+                for name, samples in self._buffers.items():
+                    if len(samples) >= self.batch_size or (samples and now - self._buffered_at[name] >= self.flush_interval):
+                        batches[name] = samples
+                for name in batches:
+                    self._buffers[name] = []
+            for name, samples in batches.items():
+                self._fit(name, samples)
+            self._checkpoint()
+
+    def _fit(self, name: str, samples: list[tuple[str, str]]):
+        transcripts = [transcript for transcript, _ in samples]
+        labels = [label for _, label in samples]
+        features = self.featurize(transcripts)
+        try:
+            # unsupervised models ignore the labels, they only selected the samples
+            self.registry.update(name, lambda model: model.partial_fit(features, labels), persist=False)
+        except Exception as e:
+            print(f"Online update of {name} failed: {e}")
+            return
+        with self._cond:
+            self.fitted[name] += len(samples)
+            self._unsaved[name] += len(samples)
+
+    def _checkpoint(self):
+        now = time.monotonic()
+        for name in list(self._unsaved):
+            if self._unsaved[name] and (self._unsaved[name] >= self.checkpoint_samples
+                                        or now - self._saved_at[name] >= self.checkpoint_interval):
+                self.registry.save(name)
+                with self._cond:
+                    self._unsaved[name] = 0
+                    self.checkpoints[name] += 1
+                self._saved_at[name] = now
@@ -0,0 +1,168 @@
+import copy
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+
+
+class ModelEntry:
+    __slots__ = ("path", "model", "mtime_ns", "generation", "checked_at", "lock", "update_lock")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.model = None
+        self.mtime_ns = None
+        self.generation = 0
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self.update_lock = threading.Lock()
+
+
+class ModelRegistry:
+    '''
+    joblib models by name, loaded on first use (or all at once with `load_all`) and warmed
+    up with a dummy prediction. Loading and saving go through `run(fn, *args)`, e.g. a thread
+    pool, so they don't block the caller's event loop; by default they run in the calling thread.
+
+    A model is never changed in place. Readers get the current object and can keep using it;
+    a changed file (checked at most every `check_interval` seconds) or an `update` swaps in a
+    new object. Updated models are written to disk by a background thread, through a temporary
+    file and os.replace, so neither requests nor readers of the file see a half-written model.
+    '''
+
+    def __init__(self, check_interval: float = 5.0, run=None):
+        self.check_interval = check_interval
+        self.run = run if run is not None else _call
+        self._entries = {}
+        self._persist_queue = None
+
+    def register(self, name: str, path: str):
+        self._entries[name] = ModelEntry(path)
+
+    def get(self, name: str):
+        entry = self._entries[name]
+        if entry.model is None:
+            with entry.lock:
+                if entry.model is None:
+                    self._load(entry)
+        elif time.monotonic() - entry.checked_at > self.check_interval:
+            self._reload_if_changed(entry)
+        return entry.model
+
+    def version(self, name: str) -> str:
+        '''
+        Changes whenever the served model does: the file it was loaded from plus in-memory updates
+        '''
+        entry = self._entries[name]
+        if entry.model is None:
+            self.get(name)
+        return f"{entry.mtime_ns}+{entry.generation}"
+
+    def load_all(self):
+        '''
+        Loads and warms up every registered model in parallel (as far as `run` allows)
+        '''
+        with ThreadPoolExecutor(max_workers=max(1, len(self._entries))) as pool:
+            list(pool.map(self.get, self._entries))
+
+    def update(self, name: str, fn, persist: bool = True):
+        '''
+        Copy-on-write update: fn(model) changes a copy of the current model (e.g. partial_fit),
+        which is then swapped in and, unless `persist` is False, saved in the background
+        '''
+        entry = self._entries[name]
+        with entry.update_lock:
+            model = copy.deepcopy(self.get(name))
+            fn(model)
+            with entry.lock:
+                entry.model = model
+                entry.generation += 1
+        if persist:
+            self._persist(name)
+
+    def save(self, name: str):
+        '''
+        Saves the current model in the background
+        '''
+        self.get(name)
+        self._persist(name)
+
+    def _load(self, entry: ModelEntry):
+        mtime_ns = os.stat(entry.path).st_mtime_ns
+        model = self.run(_read_model, entry.path)
+        entry.model, entry.mtime_ns, entry.generation = model, mtime_ns, 0
+        entry.checked_at = time.monotonic()
+
+    def _reload_if_changed(self, entry: ModelEntry):
+        # whoever gets the lock checks, everybody else keeps serving the current model
+        if not entry.lock.acquire(blocking=False):
+            return
+        try:
+            entry.checked_at = time.monotonic()
+            if os.stat(entry.path).st_mtime_ns != entry.mtime_ns:
+                print(f"Reloading {entry.path}")
+                self._load(entry)
+        except Exception as e:
+            print(f"Keeping the loaded {entry.path}: {e}")
+        finally:
+            entry.lock.release()
+
+    def _persist(self, name: str):
+        if self._persist_queue is None:
+            self._persist_queue = queue.Queue()
+            threading.Thread(target=self._persist_worker, daemon=True).start()
+        self._persist_queue.put(name)
+
+    def _persist_worker(self):
+        while True:
+            name = self._persist_queue.get()
+            entry = self._entries[name]
+            # always the newest version, whatever was current when the save was asked for
+            model = entry.model
+            tmp_path = None
+            try:
+                # a temporary file of our own, other workers may be saving the same model
+                with tempfile.NamedTemporaryFile(dir=os.path.dirname(entry.path) or ".",
+                                                 prefix=f"{os.path.basename(entry.path)}.",
+                                                 suffix=".tmp", delete=False) as tmp:
+                    tmp_path = tmp.name
+                self.run(joblib.dump, model, tmp_path)
+                if os.path.exists(entry.path):
+                    shutil.copymode(entry.path, tmp_path)  # temporary files are private to the owner
+                with entry.lock:
+                    os.replace(tmp_path, entry.path)
+                    # our own write is not a change to reload
+                    entry.mtime_ns = os.stat(entry.path).st_mtime_ns
+            except Exception as e:
+                print(f"Could not save {entry.path}: {e}")
+                if tmp_path is not None and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+
+def _call(fn, *args):
+    return fn(*args)
+
+
+def _read_model(path: str):
+    model = joblib.load(path)
+    warm_up(model)
+    return model
+
+
+def warm_up(model):
+    '''
+    One dummy prediction, so the first request doesn't pay for lazy initialization
+    '''
+    n_features = getattr(model, "n_features_in_", None)
+    if n_features is None or not hasattr(model, "predict"):
+        return
+    try:
+        model.predict(np.zeros((1, n_features)))
+    except Exception as e:
+        print(f"Warm-up of {type(model).__name__} failed: {e}")
@@ -0,0 +1,203 @@
+'''
+Adapters that feed in-memory PCM straight into the transcription and breath-param predictors.
+
+PyBreathTranscript and PyBreathParams only take file paths, so these helpers re-use their
+building blocks on NumPy sample buffers instead. Audio is kept as int16 arrays of shape
+(samples, channels); a temporary WAV is written only for methods that have no array path.
+'''
+import os
+import struct
+import wave
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
+
+import librosa
+import numpy as np
+import soundfile as sf
+from pydub import AudioSegment
+
+from PyBreathTranscript import transcript as bt
+from PyBreathTranscript.transcript_dtw import get_recognizer
+import PyBreathParams.get_breath_params as get_breath_params
+
+from tools.translate_breath import TemplateBank
+from tools import audio_fingerprinting
+
+
+FRAGMENT_LENGTH = 200  # ms, same window the transcribers use
+SAMPLE_WIDTH = 2
+
+# tmpfs keeps the fallback path off the container's overlay filesystem
+PCM_TEMP_DIR = os.getenv('PCM_TEMP_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+
+def read_wav(path) -> tuple[np.ndarray, int]:
+    '''
+    Decodes a WAV file into an int16 array of shape (samples, channels)
+    '''
+    pcm, rate = sf.read(path, dtype='int16', always_2d=True)
+    return pcm, rate
+
+
+def ms_to_samples(ms, rate: int) -> int:
+    '''
+    Sample offset for a millisecond position, rounded the way pydub slices
+    '''
+    return int(ms * rate / 1000)
+
+
+def to_segment(pcm: np.ndarray, rate: int) -> AudioSegment:
+    return AudioSegment(data=np.ascontiguousarray(pcm).tobytes(), sample_width=SAMPLE_WIDTH,
+                        frame_rate=rate, channels=pcm.shape[1])
+
+
+def to_mono_float(pcm: np.ndarray) -> np.ndarray:
+    '''
+    Same float32 mono signal librosa.load(path, sr=None) returns for a 16-bit WAV
+    '''
+    return (pcm.astype(np.float32) / 32768.0).mean(axis=1)
+
+
+def write_wav(target, pcm: np.ndarray, rate: int):
+    '''
+    Writes 16-bit PCM to a path or a binary file object
+    '''
+    with wave.open(target, 'wb') as wav:
+        wav.setnchannels(pcm.shape[1])
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(rate)
+        wav.writeframes(np.ascontiguousarray(pcm).data)
+
+
+def wav_header(data_bytes: int, rate: int, channels: int) -> bytes:
+    '''
+    44-byte header of a 16-bit PCM WAV with `data_bytes` of samples, for writing the samples as a stream
+    '''
+    block_align = channels * SAMPLE_WIDTH
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_bytes, b'WAVE',
+                       b'fmt ', 16, 1, channels, rate, rate * block_align, block_align, 8 * SAMPLE_WIDTH,
+                       b'data', data_bytes)
+
+
+@contextmanager
+def temp_wav(pcm: np.ndarray, rate: int):
+    '''
+    Fallback for predictors that can only read a file: yields the path of a short-lived WAV
+    '''
+    with NamedTemporaryFile(suffix=".wav", dir=PCM_TEMP_DIR) as tmp:
+        write_wav(tmp, pcm, rate)
+        tmp.flush()
+        yield tmp.name
+
+
+def fragments(pcm: np.ndarray, rate: int, fragment_ms: int = FRAGMENT_LENGTH):
+    '''
+    Yields consecutive fragment_ms windows as views into pcm (the last one may be shorter)
+    '''
+    duration = len(pcm) * 1000 / rate
+    for start in range(0, int(duration), fragment_ms):
+        yield pcm[ms_to_samples(start, rate):ms_to_samples(start + fragment_ms, rate)]
+
+
+_waveform_templates = None
+
+
+def waveform_templates() -> TemplateBank:
+    '''
+    PyBreathTranscript's letter waveforms, normalized once for batched FFT correlation
+    '''
+    global _waveform_templates
+    if _waveform_templates is None:
+        _waveform_templates = TemplateBank(bt.letters["letter"], bt.letters["audio_data"])
+    return _waveform_templates
+
+
+_fingerprint_letters = None
+
+
+def fingerprint_letter(features: np.ndarray) -> str:
+    '''
+    Best matching letter for an (N, 3) feature array, scored against all of
+    PyBreathTranscript's letter fingerprints in one pass
+    '''
+    global _fingerprint_letters
+    if _fingerprint_letters is None:
+        _fingerprint_letters = audio_fingerprinting.LetterIndex.from_fingerprints(bt.letters["letter"],
+                                                                                 bt.letters["fingerprint"])
+    return _fingerprint_letters.best_letter(features)
+
+
+def transcript_chunk(pcm: np.ndarray, rate: int, method=bt.FINGERPRINT) -> str:
+    '''
+    Array version of bt.transcript_chunk: one letter for one fragment
+    '''
+    signal = to_mono_float(pcm)
+    if method == bt.FINGERPRINT:
+        return fingerprint_letter(audio_fingerprinting.fingerprint_signal(signal))
+    elif method == bt.WAVEFORM:
+        scores = waveform_templates().scores(signal)
+    else:
+        with temp_wav(pcm, rate) as path:
+            return bt.transcript_chunk(path, method)
+    return bt.letters["letter"].iloc[int(np.nanargmax(scores))]
+
+
+def transcript(pcm: np.ndarray, rate: int, method=bt.FINGERPRINT) -> str:
+    '''
+    Array version of bt.transcript: one letter per 200 ms fragment
+    '''
+    if method == bt.FINGERPRINT:
+        # one batched STFT and peak map for the whole recording
+        return "".join(fingerprint_letter(features)
+                       for features in audio_fingerprinting.fingerprint_fragments(to_mono_float(pcm), rate, FRAGMENT_LENGTH))
+    return "".join(transcript_chunk(fragment, rate, method) for fragment in fragments(pcm, rate))
+
+
+def silence_symbol(pcm: np.ndarray, rate: int) -> str:
+    '''
+    DTW symbol of one live chunk ("_" for silence)
+    '''
+    return get_recognizer().process_chunk(to_segment(pcm, rate), rate)
+
+
+def silence_symbols(pcm: np.ndarray, rate: int, count: int) -> str:
+    '''
+    DTW symbols of `count` consecutive live chunks merged into one array, one per chunk
+    '''
+    return "".join(silence_symbol(chunk, rate) for chunk in np.array_split(pcm, count))
+
+
+def transcribe(pcm: np.ndarray, rate: int) -> str:
+    '''
+    Array version of transcribe_file: silence-aware DTW transcript ("_" for silence)
+    '''
+    recognizer = get_recognizer()
+    audio = to_segment(pcm, rate)
+    return "".join(recognizer.process_chunk(audio[start_ms:start_ms + FRAGMENT_LENGTH])
+                   for start_ms in range(0, len(audio), FRAGMENT_LENGTH))
+
+
+def breath_params(mode, pcm: np.ndarray, rate: int) -> str:
+    '''
+    Array version of get_breath_params.predict (IE or AR)
+    '''
+    y = librosa.resample(to_mono_float(pcm), orig_sr=rate, target_sr=get_breath_params.SR)
+    sr = get_breath_params.SR
+    if len(y) < 0.5 * sr:
+        y = np.pad(y, (0, int(0.5 * sr) - len(y)))
+    mfcc = librosa.feature.mfcc(
+        y=y,
+        sr=sr,
+        n_mfcc=get_breath_params.N_MFCC,
+        hop_length=int(get_breath_params.HOP_LENGTH * sr),
+        n_fft=int(get_breath_params.WIN_LENGTH * sr),
+    )
+    delta = librosa.feature.delta(mfcc)
+    feat = np.concatenate([mfcc, delta], axis=0).mean(axis=1)
+
+    if mode == get_breath_params.IE:
+        clf, labels = get_breath_params.model_ie, ("inhale", "exhale")
+    elif mode == get_breath_params.AR:
+        clf, labels = get_breath_params.model_ar, ("active", "resting")
+    prob = clf.predict_proba(feat.reshape(1, -1))[0]
+    return labels[0] if prob[0] > prob[1] else labels[1]
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+BACKPRESSURE = "backpressure"
+POLICIES = (DROP_OLDEST, COALESCE, BACKPRESSURE)
+
+
+class Frame:
+    '''
+    Queued audio: `count` consecutive decoded frames starting at frame `index`,
+    preceded by `dropped` frames that were dropped from the queue
+    '''
+
+    __slots__ = ("index", "pcm", "count", "dropped", "queued_at")
+
+    def __init__(self, index: int, pcm: np.ndarray):
+        self.index = index
+        self.pcm = pcm
+        self.count = 1
+        self.dropped = 0
+        self.queued_at = time.monotonic()
+
+
+class ChunkPipeline:
+    '''
+    Bounded queue between a session's decoder and a single worker thread,
+    so frames are processed strictly in order and one at a time.
+
+    `process(frame, depth, lag)` is called for every frame with the number of frames
+    still waiting and the seconds the frame spent in the queue. When `maxsize` frames
+    are waiting, `policy` decides what happens to a new one:
+      DROP_OLDEST  – the oldest waiting frame is dropped; `on_drop(count)` is called from the
+                     worker, in order, with the number of frames dropped before the next one
+      COALESCE     – the new frame is merged into the newest waiting one, which is then
+                     processed once for all of its frames; a merged frame grows to at
+                     most `maxsize` frames, after that the oldest frame is dropped
+      BACKPRESSURE – the decoder waits for room; `on_pressure(True)` is called when the
+                     queue fills up and `on_pressure(False)` once it is half empty again
+    '''
+
+    def __init__(self, process, maxsize: int, policy: str = COALESCE, on_drop=None, on_pressure=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}, expected one of {POLICIES}")
+        self.process = process
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.on_drop = on_drop
+        self.on_pressure = on_pressure
+        self.lag = 0.0
+        self.dropped = 0
+        self.coalesced = 0
+        self.pressure = False
+        self._queue = deque()
+        self._closed = False
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def put(self, index: int, pcm: np.ndarray):
+        '''
+        Queues one decoded frame, called from the decoder's reader thread
+        '''
+        pressure = False
+        dropped = 0
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                newest = self._queue[-1]
+                if self.policy == COALESCE and newest.count < self.maxsize:
+                    newest.pcm = np.concatenate([newest.pcm, pcm])
+                    newest.count += 1
+                    self.coalesced += 1
+                    return
+                elif self.policy != BACKPRESSURE:
+                    oldest = self._queue.popleft()
+                    # reported when the worker gets to the next frame, so the drop keeps its place
+                    dropped = oldest.dropped + oldest.count
+                    self.dropped += oldest.count
+                else:
+                    pressure = not self.pressure
+                    self.pressure = True
+            self._queue.append(Frame(index, pcm))
+            self._queue[0].dropped += dropped
+            self._cond.notify_all()
+        if pressure and self.on_pressure is not None:
+            self.on_pressure(True)
+        if self.policy == BACKPRESSURE:
+            with self._cond:
+                while len(self._queue) > self.maxsize and not self._closed:
+                    self._cond.wait()
+
+    def close(self, drain: bool = True):
+        '''
+        Stops the worker once the waiting frames are processed (or right away if `drain` is False)
+        '''
+        with self._cond:
+            self._closed = True
+            if not drain:
+                self._queue.clear()
+            self._cond.notify_all()
+        if threading.current_thread() is not self._worker:
+            self._worker.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                frame = self._queue.popleft()
+                depth = len(self._queue)
+                released = self.pressure and depth <= self.maxsize // 2
+                if released:
+                    self.pressure = False
+                self._cond.notify_all()
+            if released and self.on_pressure is not None:
+                self.on_pressure(False)
+            if frame.dropped and self.on_drop is not None:
+                try:
+                    self.on_drop(frame.dropped)
+                except Exception as e:
+                    print(f"Dropping before chunk {frame.index} failed: {e}")
+            self.lag = time.monotonic() - frame.queued_at
+            try:
+                self.process(frame, depth, self.lag)
+            except Exception as e:
+                print(f"Chunk {frame.index} failed: {e}")
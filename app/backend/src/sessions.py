@@ -0,0 +1,388 @@
+import glob
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from src.features import NgramFeatures
+from src.store import InMemoryStore
+
+
+LOG_ENCODING = "utf-32-le"  # fixed width, no byte order mark
+LOG_SYMBOL_BYTES = 4
+
+
+class TranscriptBuffer:
+    '''
+    Append-only transcript of a live session that keeps at most `tail_chars` symbols in memory.
+
+    Every symbol is also appended to a spill log on disk, so `since(offset)` can return
+    text that has already left the in-memory tail. Offsets are absolute positions in the
+    whole transcript. Symbols are any characters (the letters are Cyrillic); the log stores
+    them as UTF-32, four bytes each, so an offset is found by seeking instead of decoding.
+    '''
+
+    __slots__ = ("tail_chars", "path", "length", "_tail", "_log")
+
+    def __init__(self, tail_chars: int, path: str | None = None):
+        self.tail_chars = tail_chars
+        self.path = path
+        self.length = 0
+        self._tail = deque()
+        self._log = open(path, "ab") if path is not None else None
+
+    def __len__(self) -> int:
+        return self.length
+
+    def append(self, text: str):
+        if self._log is not None:
+            self._log.write(text.encode(LOG_ENCODING))
+            self._log.flush()
+        self._tail.extend(text)
+        self.length += len(text)
+        while len(self._tail) > self.tail_chars:
+            self._tail.popleft()
+
+    def since(self, offset: int) -> str:
+        '''
+        Transcript from absolute position `offset` to the end
+        '''
+        offset = max(offset, 0)
+        tail_start = self.length - len(self._tail)
+        if offset >= tail_start:
+            return "".join(itertools.islice(self._tail, offset - tail_start, None))
+        if self._log is None:
+            # nothing older than the tail is kept
+            return "".join(self._tail)
+        with open(self.path, "rb") as f:
+            f.seek(offset * LOG_SYMBOL_BYTES)
+            return f.read().decode(LOG_ENCODING)
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._tail)
+
+    @property
+    def disk_bytes(self) -> int:
+        return self.length * LOG_SYMBOL_BYTES if self._log is not None else 0
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+            os.remove(self.path)
+
+
+class PcmLog:
+    '''
+    Decoded audio of a live recording, appended to a raw int16 file as the decoder produces it.
+
+    The last `ring_ms` of audio are also kept in memory as the decoder's own frames, so
+    recent ranges are sliced without touching the disk; older ranges are read back with
+    a single seek. Either way a read costs the length of the range, not of the recording.
+    '''
+
+    __slots__ = ("path", "rate", "channels", "samples", "ring_samples", "_ring", "_ring_size", "_file")
+
+    def __init__(self, path: str, rate: int, channels: int, ring_ms: float = 0):
+        self.path = path
+        self.rate = rate
+        self.channels = channels
+        self.samples = 0
+        self.ring_samples = int(ring_ms * rate / 1000)
+        self._ring = deque()  # (first sample, frame)
+        self._ring_size = 0
+        self._file = open(path, "wb")
+
+    @property
+    def duration_ms(self) -> float:
+        return self.samples * 1000 / self.rate
+
+    def append(self, pcm: np.ndarray):
+        pcm = np.ascontiguousarray(pcm, dtype=np.int16)
+        self._file.write(pcm.data)
+        self._file.flush()
+        if self.ring_samples:
+            self._ring.append((self.samples, pcm))
+            self._ring_size += len(pcm)
+            while self._ring_size - len(self._ring[0][1]) >= self.ring_samples:
+                self._ring_size -= len(self._ring.popleft()[1])
+        self.samples += len(pcm)
+
+    def read(self, start_ms: float, end_ms: float | None = None) -> np.ndarray:
+        '''
+        int16 samples of shape (samples, channels) from start_ms to end_ms (or the end)
+        '''
+        start = min(max(int(start_ms * self.rate / 1000), 0), self.samples)
+        end = self.samples if end_ms is None else min(max(int(end_ms * self.rate / 1000), start), self.samples)
+        if end == start:
+            return np.zeros((0, self.channels), dtype=np.int16)
+        ring = list(self._ring)
+        if ring and start >= ring[0][0]:
+            parts = [frame[max(start - first, 0):end - first]
+                     for first, frame in ring if first < end and first + len(frame) > start]
+            return np.concatenate(parts) if len(parts) > 1 else parts[0].copy()
+        data = np.fromfile(self.path, dtype=np.int16, count=(end - start) * self.channels,
+                           offset=start * self.channels * np.dtype(np.int16).itemsize)
+        return data.reshape(-1, self.channels)
+
+    def stream(self, block_bytes: int = 1 << 20):
+        '''
+        Raw sample bytes of the recording so far, in blocks. The file is opened right away,
+        so the blocks can still be read once the log is closed.
+        '''
+        f = open(self.path, "rb")
+        size = self.disk_bytes
+
+        def blocks():
+            with f:
+                remaining = size
+                while remaining > 0:
+                    block = f.read(min(block_bytes, remaining))
+                    if not block:
+                        break
+                    remaining -= len(block)
+                    yield block
+
+        return blocks()
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._ring_size * self.channels * np.dtype(np.int16).itemsize
+
+    @property
+    def disk_bytes(self) -> int:
+        return self.samples * self.channels * np.dtype(np.int16).itemsize
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self.path)
+
+
+class Session:
+    '''
+    State of one live Socket.IO client.
+
+    SETTINGS are the fields set by requests; they are kept in the shared store so any worker
+    can read them. Everything else (decoder, pipeline, transcript) lives on the owning worker.
+    '''
+
+    SETTINGS = ("autosplit", "file_name",
+                "auto_breath", "auto_breath_by_text", "auto_breath_by_audio",
+                "auto_activity", "auto_activity_by_text", "auto_activity_by_audio",
+                "data_collect_filename")
+
+    __slots__ = ("sid", "chunks", "transcript", "silence", "last_transcript_length", "features",
+                 "autosplit", "file_name",
+                 "auto_breath", "auto_breath_by_text", "auto_breath_by_audio",
+                 "auto_activity", "auto_activity_by_text", "auto_activity_by_audio",
+                 "data_collect_filename", "decoder", "pipeline", "recording", "last_cut_ms",
+                 "live", "live_pending", "last_seen")
+
+    def __init__(self, sid: str, transcript: TranscriptBuffer):
+        self.sid = sid
+        self.chunks = 0
+        self.transcript = transcript
+        self.silence = None
+        self.last_transcript_length = 0
+        self.features = NgramFeatures()  # of the transcript since the last cut
+        self.autosplit = False
+        self.file_name = False
+        self.auto_breath = False
+        self.auto_breath_by_text = False
+        self.auto_breath_by_audio = False
+        self.auto_activity = False
+        self.auto_activity_by_text = False
+        self.auto_activity_by_audio = False
+        self.data_collect_filename = ""
+        self.decoder = None
+        self.pipeline = None
+        self.recording = None
+        self.last_cut_ms = 0
+        self.live = None  # the latest live predictions since the last cut
+        self.live_pending = False
+        self.last_seen = time.monotonic()
+
+    def close_decoder(self):
+        '''
+        Flushes the decoder into the chunk pipeline and waits for the pipeline to finish
+        '''
+        decoder, self.decoder = self.decoder, None
+        if decoder is not None:
+            decoder.close()
+        pipeline, self.pipeline = self.pipeline, None
+        if pipeline is not None:
+            pipeline.close()
+
+
+class SessionRegistry:
+    '''
+    Live sessions by sid, with idle eviction.
+
+    `store` (see src.store) is shared by all workers: it records which worker owns a session,
+    i.e. holds its socket and decoder, and the session's settings. Store records expire after
+    the TTL unless the owner keeps refreshing them from `sweep()`.
+
+    `files` are per-session file name templates with a `{sid}` field (recordings,
+    temporary chunks). Only the owner creates and deletes a session's files; they are
+    deleted together with its session, and files left behind by sessions that no longer
+    exist are deleted by `sweep()`. Other workers' copies of a session hold settings only.
+    '''
+
+    def __init__(self, ttl: float, tail_chars: int, spill_folder: str | None = None, files: tuple = (),
+                 store=None, worker_id: str = "0"):
+        self.ttl = ttl
+        self.store_ttl = int(math.ceil(ttl))  # Redis EXPIRE takes whole seconds only
+        self.tail_chars = tail_chars
+        self.spill_folder = spill_folder
+        self.files = files
+        self.store = store if store is not None else InMemoryStore()
+        self.worker_id = worker_id
+        self._sessions = {}
+        self._lock = threading.Lock()
+        if spill_folder is not None:
+            os.makedirs(spill_folder, exist_ok=True)
+
+    def get(self, sid: str) -> Session:
+        '''
+        Session of `sid`, created on first use, with the latest settings from the store
+        '''
+        state = self.store.hget(self._key(sid), "state")
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None:
+                # the spill folder may be shared, a copy on another worker must not touch the owner's log
+                owned = self.spill_folder is not None and self.owner(sid) == self.worker_id
+                spill_path = os.path.join(self.spill_folder, f"transcript_{sid}.log") if owned else None
+                session = self._sessions[sid] = Session(sid, TranscriptBuffer(self.tail_chars, spill_path))
+        for field, value in json.loads(state or "{}").items():
+            setattr(session, field, value)
+        session.last_seen = time.monotonic()
+        return session
+
+    def claim(self, sid: str) -> Session:
+        '''
+        Makes this worker the owner of `sid`, called where the client's socket is connected
+        '''
+        self.store.hset(self._key(sid), "owner", self.worker_id)
+        self.store.expire(self._key(sid), self.store_ttl)
+        return self.get(sid)
+
+    def owner(self, sid: str) -> str | None:
+        return self.store.hget(self._key(sid), "owner")
+
+    def new_recording(self, session: Session, rate: int, channels: int, ring_ms: float = 0) -> PcmLog:
+        '''
+        Starts an empty PCM log for the session's next recording, replacing the previous one
+        '''
+        if session.recording is not None:
+            session.recording.close()
+        folder = self.spill_folder if self.spill_folder is not None else "."
+        session.recording = PcmLog(os.path.join(folder, f"pcm_{session.sid}.raw"), rate, channels, ring_ms)
+        session.last_cut_ms = 0
+        return session.recording
+
+    def save(self, session: Session):
+        '''
+        Publishes the session's settings to the other workers
+        '''
+        self.save_settings(session.sid, {field: getattr(session, field) for field in Session.SETTINGS})
+
+    def save_settings(self, sid: str, settings: dict):
+        '''
+        Updates settings of `sid` in the store, and in the local session if there is one,
+        without creating a session here
+        '''
+        settings = {field: value for field, value in settings.items() if field in Session.SETTINGS}
+        state = json.loads(self.store.hget(self._key(sid), "state") or "{}")
+        state.update(settings)
+        self.store.hset(self._key(sid), "state", json.dumps(state))
+        self.store.expire(self._key(sid), self.store_ttl)
+        session = self.peek(sid)
+        if session is not None:
+            for field, value in settings.items():
+                setattr(session, field, value)
+
+    def peek(self, sid: str) -> Session | None:
+        '''
+        Session of `sid` if it is still live, without creating or touching it
+        '''
+        with self._lock:
+            return self._sessions.get(sid)
+
+    def remove(self, sid: str):
+        owned = self.owner(sid) == self.worker_id
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+        if session is not None:
+            session.close_decoder()
+            session.transcript.close()
+            if session.recording is not None:
+                session.recording.close()
+            if owned:
+                self.store.delete(self._key(sid))
+        # the owner's files, if another worker owns the session (orphans are left to sweep())
+        if owned:
+            self._remove_files(sid)
+
+    def sweep(self) -> list[str]:
+        '''
+        Removes sessions idle for longer than the TTL and orphaned session files,
+        returns the evicted sids
+        '''
+        now = time.monotonic()
+        with self._lock:
+            expired = [sid for sid, session in self._sessions.items() if now - session.last_seen > self.ttl]
+            live = [sid for sid in self._sessions if sid not in expired]
+        for sid in expired:
+            self.remove(sid)
+        for sid in live:
+            self.store.expire(self._key(sid), self.store_ttl)
+        for pattern in self._patterns():
+            prefix, suffix = pattern.split("{sid}")
+            for path in glob.glob(pattern.format(sid="*")):
+                sid = path[len(prefix):len(path) - len(suffix)]
+                # other workers may share the folder, their sessions are in the store
+                if self.peek(sid) is None and not self.store.exists(self._key(sid)):
+                    self._try_remove(path)
+        return expired
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {"sessions": len(sessions),
+                "transcript_memory_bytes": sum(session.transcript.memory_bytes for session in sessions),
+                "transcript_disk_bytes": sum(session.transcript.disk_bytes for session in sessions),
+                "recording_memory_bytes": sum(session.recording.memory_bytes for session in sessions if session.recording is not None),
+                "recording_disk_bytes": sum(session.recording.disk_bytes for session in sessions if session.recording is not None),
+                "decoders": sum(session.decoder is not None for session in sessions),
+                "queued_frames": sum(session.pipeline.depth for session in sessions if session.pipeline is not None)}
+
+    @staticmethod
+    def _key(sid: str) -> str:
+        return f"session:{sid}"
+
+    def _patterns(self) -> list[str]:
+        folder = self.spill_folder if self.spill_folder is not None else "."
+        patterns = [*self.files, os.path.join(folder, "pcm_{sid}.raw")]
+        if self.spill_folder is not None:
+            patterns.append(os.path.join(self.spill_folder, "transcript_{sid}.log"))
+        return patterns
+
+    def _remove_files(self, sid: str):
+        for pattern in self._patterns():
+            self._try_remove(pattern.format(sid=sid))
+
+    @staticmethod
+    def _try_remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,71 @@
+SILENCE_SYMBOL = "_"
+
+
+class SilenceDetector:
+    '''
+    Streaming silence detector over a silence transcript.
+
+    A silence starts wherever `letters_before` symbols that are not "_" are followed
+    immediately by `silence_length` underscores. Only the lengths of the current letter
+    and underscore runs are kept, so every symbol costs O(1) and a live session holds
+    constant state instead of the whole transcript.
+    '''
+
+    __slots__ = ("letters_before", "silence_length", "position", "_letters", "_underscores", "_letters_before_underscores")
+
+    def __init__(self, letters_before: int, silence_length: int):
+        if letters_before < 1 or silence_length < 1:
+            raise ValueError("letters_before and silence_length must be at least 1")
+        self.letters_before = letters_before
+        self.silence_length = silence_length
+        self.position = 0
+        self._letters = 0
+        self._underscores = 0
+        self._letters_before_underscores = 0
+
+    def push(self, symbol: str) -> int | None:
+        '''
+        Consumes one symbol and returns the start index of the silence pattern
+        that ends with it, or None
+        '''
+        self.position += 1
+        if symbol != SILENCE_SYMBOL:
+            # runs are capped, longer runs match the same way
+            self._letters = min(self._letters + 1, self.letters_before)
+            self._underscores = 0
+            return None
+        if self._underscores == 0:
+            self._letters_before_underscores = self._letters
+            self._letters = 0
+        self._underscores = min(self._underscores + 1, self.silence_length + 1)
+        if self._underscores == self.silence_length and self._letters_before_underscores >= self.letters_before:
+            return self.position - self.letters_before - self.silence_length
+        return None
+
+    def skip(self, count: int):
+        '''
+        Consumes `count` unknown symbols (e.g. chunks that were not transcribed): they are
+        neither letters nor silence, so no pattern can run across them
+        '''
+        self.position += count
+        self._letters = 0
+        self._underscores = 0
+        self._letters_before_underscores = 0
+
+    def feed(self, text: str) -> list[int]:
+        '''
+        Consumes every symbol of `text` and returns the start indices of the silences found
+        '''
+        indices = []
+        for symbol in text:
+            index = self.push(symbol)
+            if index is not None:
+                indices.append(index)
+        return indices
+
+
+def scan(text: str, letters_before: int, silence_length: int) -> list[int]:
+    '''
+    Start indices of all silences in a whole transcript
+    '''
+    return SilenceDetector(letters_before, silence_length).feed(text)
@@ -0,0 +1,78 @@
+import threading
+import time
+
+
+class InMemoryStore:
+    '''
+    The subset of the Redis client API the backend uses for shared state (hashes with expiry),
+    kept in process memory.
+
+    It is the default for a single worker and a stand-in for Redis in tests;
+    values are stored as strings, like a Redis client with decode_responses=True returns them.
+    '''
+
+    def __init__(self):
+        self._hashes = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def hset(self, name: str, key: str | None = None, value=None, mapping: dict | None = None) -> int:
+        fields = dict(mapping or {})
+        if key is not None:
+            fields[key] = value
+        with self._lock:
+            record = self._live(name)
+            if record is None:
+                record = self._hashes[name] = {}
+            added = sum(field not in record for field in fields)
+            record.update({field: str(value) for field, value in fields.items()})
+            return added
+
+    def hget(self, name: str, key: str) -> str | None:
+        with self._lock:
+            record = self._live(name)
+            return record.get(key) if record is not None else None
+
+    def hgetall(self, name: str) -> dict:
+        with self._lock:
+            record = self._live(name)
+            return dict(record) if record is not None else {}
+
+    def exists(self, *names: str) -> int:
+        with self._lock:
+            return sum(self._live(name) is not None for name in names)
+
+    def expire(self, name: str, seconds: int) -> bool:
+        if not isinstance(seconds, int):
+            # as strict as Redis, so a float TTL fails here too and not only in production
+            raise ValueError(f"value is not an integer or out of range: {seconds!r}")
+        with self._lock:
+            if self._live(name) is None:
+                return False
+            self._expires[name] = time.monotonic() + seconds
+            return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            deleted = 0
+            for name in names:
+                deleted += self._live(name) is not None
+                self._hashes.pop(name, None)
+                self._expires.pop(name, None)
+            return deleted
+
+    def _live(self, name: str) -> dict | None:
+        expires = self._expires.get(name)
+        if expires is not None and expires <= time.monotonic():
+            del self._hashes[name], self._expires[name]
+        return self._hashes.get(name)
+
+
+def open_store(url: str | None):
+    '''
+    Redis client for `url` (redis://host:port/db), or an InMemoryStore if no url is given
+    '''
+    if not url:
+        return InMemoryStore()
+    import redis  # only needed for multi-worker deployments
+    return redis.Redis.from_url(url, decode_responses=True)
@@ -0,0 +1,77 @@
+import subprocess
+import threading
+
+import numpy as np
+
+
+SAMPLE_WIDTH = 2  # s16le
+
+
+class StreamDecoder:
+    '''
+    Long-lived ffmpeg process that decodes one session's webm/opus stream.
+
+    Chunks are written to ffmpeg's stdin as they arrive and raw PCM is read back
+    from stdout, so every byte of the recording is decoded exactly once. Each complete
+    `frame_ms` window of audio is passed to `on_frame(index, pcm)` as an int16 array
+    of shape (samples, channels), in order, from a single reader thread.
+    '''
+
+    def __init__(self, on_frame, rate: int = 44100, channels: int = 2, frame_ms: int = 200):
+        self.on_frame = on_frame
+        self.rate = rate
+        self.channels = channels
+        self.frame_bytes = int(rate * frame_ms / 1000) * channels * SAMPLE_WIDTH
+        self.frames = 0
+        self.process = subprocess.Popen([
+            "ffmpeg", "-loglevel", "error", "-fflags", "+genpts+nobuffer",
+            "-i", "pipe:0", "-ar", str(rate), "-ac", str(channels),
+            "-f", "s16le", "-flush_packets", "1", "pipe:1"
+        ], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def feed(self, chunk: bytes):
+        '''
+        Hands newly received container bytes to the decoder
+        '''
+        self.process.stdin.write(chunk)
+        self.process.stdin.flush()
+
+    def close(self):
+        '''
+        Closes the input, waits for ffmpeg to drain and delivers the last (possibly short) frame
+        '''
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+        self.reader.join()
+
+    def _read(self):
+        # a read returns whatever the pipe holds (one os.read on a green pipe, often a ~20 ms
+        # packet), so bytes are collected until a whole frame is there
+        buffer = bytearray()
+        sample_bytes = self.channels * SAMPLE_WIDTH
+        while True:
+            data = self.process.stdout.read(self.frame_bytes - len(buffer))
+            if not data:
+                break
+            buffer += data
+            if len(buffer) >= self.frame_bytes:
+                self._emit(bytes(buffer[:self.frame_bytes]))
+                del buffer[:self.frame_bytes]
+        # the last, short frame, cut to whole samples
+        tail = len(buffer) - len(buffer) % sample_bytes
+        if tail:
+            self._emit(bytes(buffer[:tail]))
+
+    def _emit(self, data: bytes):
+        pcm = np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels)
+        try:
+            self.on_frame(self.frames, pcm)
+        except Exception as e:
+            # keep reading, a stopped reader would leave ffmpeg blocked on a full stdout
+            print(f"Frame {self.frames} failed: {e}")
+        self.frames += 1
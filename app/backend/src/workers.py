@@ -0,0 +1,56 @@
+import atexit
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+_pool = None
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    '''
+    Shared process pool for CPU-bound model inference, created on first use
+    '''
+    global _pool
+    if _pool is None:
+        # by then tpool has OS threads running, which a forked child would inherit mid-flight,
+        # so workers are spawned fresh (forkserver needs real sockets, not eventlet's green ones)
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        # a pool that is still open at exit keeps a monkey-patched interpreter from exiting
+        atexit.register(shutdown_pool)
+    return _pool
+
+
+def shutdown_pool():
+    '''
+    Stops the shared pool's workers, if it was ever started
+    '''
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def map_ordered(fn, tasks: list[tuple], workers: int, limit: int, on_result=None) -> list:
+    '''
+    Runs fn(*task) for every task on the shared pool and returns the results in task order.
+    At most `limit` tasks of one call are in flight at a time, so a single long request
+    leaves the remaining workers to everybody else.
+    `on_result(index)` is called as each result is gathered.
+    '''
+    pool = get_pool(workers)
+    results = []
+    pending = deque()
+
+    def gather():
+        results.append(pending.popleft().result())
+        if on_result is not None:
+            on_result(len(results) - 1)
+
+    for task in tasks:
+        if len(pending) >= limit:
+            gather()
+        pending.append(pool.submit(fn, *task))
+    while pending:
+        gather()
+    return results
@@ -1,10 +1,17 @@
 import numpy as np
 import librosa
-from pydub import AudioSegment
 from scipy.ndimage import maximum_filter
-import pandas as pd
+from scipy.spatial import cKDTree
 from math import exp, sqrt
 import ast
+import os
+import sys
+
+FINGERPRINT_CSV = "fingerprint.csv"
+FINGERPRINT_STORE = "fingerprint.npz"
+
+# Largest number of feature pairs compared by broadcasting before switching to a KD-tree
+BROADCAST_LIMIT = 250_000
 
 def load_audio(file_path):
     # Load the audio file
@@ -25,42 +32,93 @@ def extract_peaks(S_db, amp_min=-40, neighborhood_size=(20, 20)):
     """
     Identify local spectral peaks in the dB-scaled spectrogram.
     Only peaks above the amp_min threshold are retained.
+    Returns an (N, 2) int array of (freq, time) rows.
     """
     local_max = maximum_filter(S_db, size=neighborhood_size) == S_db
     detected_peaks = np.where(local_max & (S_db >= amp_min))
-    peaks = list(zip(detected_peaks[0], detected_peaks[1]))
-    return peaks
+    return np.column_stack(detected_peaks).astype(np.int64)
 
 def generate_features_from_peaks(peaks, fan_value=5, delta_time_max=10):
     """
     Instead of generating discrete hash strings, generate numerical fingerprint
-    features. Each feature is a tuple: (freq1, freq2, time_delta)
+    features. Each feature is a row: (freq1, freq2, time_delta)
     where freq1 and freq2 are frequency bins of paired peaks and time_delta is their time difference.
+
+    Every peak is paired with the next fan_value peaks in time order. All candidate pairs
+    are compared at once as an (N, fan_value) grid of shifted indices; reading the valid
+    ones in row-major order gives the same features, in the same order, as the nested loop.
+    Returns an (M, 3) int array.
     """
-    peaks.sort(key=lambda x: x[1])  # sort by time
-    features = []
+    peaks = np.asarray(peaks, dtype=np.int64).reshape(-1, 2)
+    peaks = peaks[np.argsort(peaks[:, 1], kind="stable")]  # sort by time
+    freqs, times = peaks[:, 0], peaks[:, 1]
     num_peaks = len(peaks)
-    
-    for i in range(num_peaks):
-        freq1, time1 = peaks[i]
-        for j in range(1, fan_value + 1):
-            if i + j < num_peaks:
-                freq2, time2 = peaks[i + j]
-                time_delta = time2 - time1
-                if 0 < time_delta <= delta_time_max:
-                    features.append((freq1, freq2, time_delta))
-    return features
+
+    partners = np.arange(num_peaks)[:, None] + np.arange(1, fan_value + 1)[None, :]
+    in_range = partners < num_peaks
+    partners = np.where(in_range, partners, 0)
+    time_deltas = times[partners] - times[:, None]
+    valid = in_range & (time_deltas > 0) & (time_deltas <= delta_time_max)
+
+    rows, cols = np.nonzero(valid)
+    return np.column_stack([freqs[rows], freqs[partners[rows, cols]], time_deltas[rows, cols]])
 
 def extract_audio_fingerprint(audio_file):
     """
     Extract continuous fingerprint features from an audio file.
-    Returns a list of tuples (freq1, freq2, time_delta)
+    Returns an (N, 3) int array of (freq1, freq2, time_delta) rows
     """
     S_db, sr = compute_spectrogram(audio_file)
     peaks = extract_peaks(S_db, amp_min=-40, neighborhood_size=(20, 20))
     features = generate_features_from_peaks(peaks, fan_value=5, delta_time_max=10)
     return features
 
+def fingerprint_signal(y):
+    """
+    extract_audio_fingerprint for a signal that is already loaded.
+    """
+    S = np.abs(librosa.stft(y, n_fft=2048, hop_length=512))
+    S_db = librosa.amplitude_to_db(S, ref=np.max)
+    peaks = extract_peaks(S_db, amp_min=-40, neighborhood_size=(20, 20))
+    return generate_features_from_peaks(peaks, fan_value=5, delta_time_max=10)
+
+def fragment_bounds(n_samples, sr, fragment_ms=200):
+    """
+    Sample ranges of consecutive fragment_ms windows, sliced the way pydub slices milliseconds.
+    """
+    duration = n_samples / sr * 1000
+    return [(int(x * sr / 1000), min(int((x + fragment_ms) * sr / 1000), n_samples))
+            for x in range(0, int(duration), fragment_ms)]
+
+def fingerprint_fragments(y, sr, fragment_ms=200):
+    """
+    Fingerprint of every fragment_ms window of a whole recording, equal to running
+    extract_audio_fingerprint on each exported fragment.
+
+    All full-length fragments go through one batched STFT and one peak-map filter pass.
+    Every fragment is still its own STFT frame grid (zero padded at its edges, dB relative
+    to its own maximum, peak neighbourhoods reflected at its own borders), so features
+    match the per-fragment path; only a shorter last fragment is done on its own.
+    """
+    bounds = fragment_bounds(len(y), sr, fragment_ms)
+    if not bounds:
+        return []
+    fragment_length = bounds[0][1] - bounds[0][0]
+    batch = [i for i, (start, end) in enumerate(bounds) if end - start == fragment_length]
+    frames = np.stack([y[bounds[i][0]:bounds[i][1]] for i in batch])
+    S = np.abs(librosa.stft(frames, n_fft=2048, hop_length=512))
+    S_db = np.stack([librosa.amplitude_to_db(spectrum, ref=np.max) for spectrum in S])
+    local_max = maximum_filter(S_db, size=(1, 20, 20)) == S_db
+    fragment, freq, time = np.where(local_max & (S_db >= -40))
+    splits = np.searchsorted(fragment, np.arange(1, len(batch)))
+
+    fingerprints = {}
+    for i, peak_freq, peak_time in zip(batch, np.split(freq, splits), np.split(time, splits)):
+        fingerprints[i] = generate_features_from_peaks(np.column_stack([peak_freq, peak_time]), fan_value=5, delta_time_max=10)
+    # a shorter last fragment has its own frame count
+    return [fingerprints[i] if i in fingerprints else fingerprint_signal(y[start:end])
+            for i, (start, end) in enumerate(bounds)]
+
 def feature_distance(feat1, feat2):
     """
     Compute Euclidean distance between two fingerprint features.
@@ -75,6 +133,28 @@ def gaussian_similarity(distance, sigma=10.0):
     """
     return exp(- (distance ** 2) / (2 * sigma ** 2))
 
+def as_features(features):
+    """
+    Fingerprint features as a float (N, 3) array, whatever container they come in.
+    """
+    return np.asarray(features, dtype=np.float64).reshape(-1, 3)
+
+def nearest_distances(features_A, features_B):
+    """
+    Euclidean distance from every feature in A to its closest feature in B.
+    Small sets are compared by broadcasting, larger ones go through a KD-tree.
+    """
+    if len(features_A) * len(features_B) <= BROADCAST_LIMIT:
+        diff = features_A[:, None, :] - features_B[None, :, :]
+        return np.sqrt((diff ** 2).sum(axis=2)).min(axis=1)
+    return cKDTree(features_B).query(features_A)[0]
+
+def gaussian_similarities(distances, sigma=10.0):
+    """
+    Vectorized gaussian_similarity.
+    """
+    return np.exp(- (distances ** 2) / (2 * sigma ** 2))
+
 def compute_continuous_similarity(fp_features1, fp_features2, sigma=10.0):
     """
     Compute a continuous similarity score between two sets of fingerprint features.
@@ -83,58 +163,146 @@ def compute_continuous_similarity(fp_features1, fp_features2, sigma=10.0):
     (using Euclidean distance), convert that distance into a similarity score via a Gaussian kernel,
     and average these scores. Repeat symmetrically and then average both directions.
     """
-    if not fp_features1 or not fp_features2:
+    features_1 = as_features(fp_features1)
+    features_2 = as_features(fp_features2)
+    if len(features_1) == 0 or len(features_2) == 0:
         return 0.0
 
-    def avg_similarity(features_A, features_B):
-        total_sim = 0.0
-        for feat_A in features_A:
-            # Find the minimum distance to any feature in features_B
-            min_dist = min(feature_distance(feat_A, feat_B) for feat_B in features_B)
-            total_sim += gaussian_similarity(min_dist, sigma=sigma)
-        return total_sim / len(features_A)
-    
-    sim1 = avg_similarity(fp_features1, fp_features2)
-    sim2 = avg_similarity(fp_features2, fp_features1)
+    sim1 = gaussian_similarities(nearest_distances(features_1, features_2), sigma).mean()
+    sim2 = gaussian_similarities(nearest_distances(features_2, features_1), sigma).mean()
     # Average the two directional similarities
-    return (sim1 + sim2) / 2
+    return float((sim1 + sim2) / 2)
+
+class LetterIndex:
+    """
+    Every letter fingerprint packed into one contiguous (N, 3) array with per-letter offsets,
+    so a fragment is scored against all letters in one pass.
+    Scores are the same as compute_continuous_similarity(fragment, letter) for each letter.
+    """
+
+    def __init__(self, names, features, offsets):
+        self.names = list(names)
+        self.features = as_features(features)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.lengths = np.diff(self.offsets)
+        self._nonempty = self.lengths > 0
+        self._trees = None
+
+    @classmethod
+    def from_fingerprints(cls, names, fingerprints):
+        arrays = [as_features(fingerprint) for fingerprint in fingerprints]
+        offsets = np.concatenate([[0], np.cumsum([len(array) for array in arrays])])
+        features = np.concatenate(arrays) if arrays else np.empty((0, 3))
+        return cls(names, features, offsets)
+
+    def similarities(self, fragment_features, sigma=10.0):
+        """
+        Similarity of the fragment to every letter, in letter order.
+        """
+        fragment = as_features(fragment_features)
+        scores = np.zeros(len(self.names))
+        if len(fragment) == 0 or not self._nonempty.any():
+            return scores
+        starts = self.offsets[:-1][self._nonempty]
+
+        if len(fragment) * len(self.features) <= BROADCAST_LIMIT:
+            diff = fragment[:, None, :] - self.features[None, :, :]
+            distances = np.sqrt((diff ** 2).sum(axis=2))
+            # fragment -> letter: closest feature inside each letter's block of columns
+            to_letters = np.minimum.reduceat(distances, starts, axis=1)
+            # letter -> fragment: closest fragment feature for every letter feature
+            from_letters = distances.min(axis=0)
+        else:
+            if self._trees is None:
+                self._trees = [cKDTree(self.features[start:start + length])
+                               for start, length in zip(starts, self.lengths[self._nonempty])]
+            to_letters = np.column_stack([tree.query(fragment)[0] for tree in self._trees])
+            from_letters = cKDTree(fragment).query(self.features)[0]
+
+        sim1 = gaussian_similarities(to_letters, sigma).mean(axis=0)
+        sim2 = np.add.reduceat(gaussian_similarities(from_letters, sigma), starts) / self.lengths[self._nonempty]
+        scores[self._nonempty] = (sim1 + sim2) / 2
+        return scores
 
-letters = pd.read_csv("fingerprint.csv")
+    def best_letter(self, fragment_features, sigma=10.0):
+        return self.names[int(np.argmax(self.similarities(fragment_features, sigma)))]
 
 def parse_fingerprint(fingerprint_str):
     try:
-        if pd.isna(fingerprint_str):
+        if not isinstance(fingerprint_str, str):
             return []
-        parsed_list = eval(fingerprint_str.strip())
-        return [(np.int64(a), np.int64(b), np.int64(c)) for (a, b, c) in parsed_list]
+        parsed_list = ast.literal_eval(fingerprint_str.strip())
+        return [(int(a), int(b), int(c)) for (a, b, c) in parsed_list]
     except (SyntaxError, ValueError, TypeError) as e:
         print(f"Error parsing row: {fingerprint_str} — {e}")
         return []
 
-letters["fingerprint"] = letters["fingerprint"].apply(parse_fingerprint)
+def build_letter_store(csv_path=FINGERPRINT_CSV, store_path=FINGERPRINT_STORE):
+    """
+    Convert the letter fingerprint CSV into the binary store: letter names, one contiguous
+    int64 (N, 3) feature array and per-letter offsets into it.
+    """
+    import pandas as pd
+
+    letters = pd.read_csv(csv_path)
+    fingerprints = [np.array(parse_fingerprint(fingerprint), dtype=np.int64).reshape(-1, 3)
+                    for fingerprint in letters["fingerprint"]]
+    offsets = np.concatenate([[0], np.cumsum([len(fingerprint) for fingerprint in fingerprints])]).astype(np.int64)
+    features = np.concatenate(fingerprints) if fingerprints else np.empty((0, 3), dtype=np.int64)
+    # written next to the store and renamed, so a reader never opens a half-written file
+    tmp_path = f"{store_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, letters=np.array(letters["letter"], dtype=str), features=features, offsets=offsets)
+    os.replace(tmp_path, store_path)
+
+def letter_store_stale(csv_path=FINGERPRINT_CSV, store_path=FINGERPRINT_STORE):
+    """
+    True if the store is missing or older than the CSV it was built from.
+    """
+    if not os.path.exists(store_path):
+        return True
+    return os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(store_path)
+
+def load_letter_store(store_path=FINGERPRINT_STORE):
+    with np.load(store_path) as store:
+        return LetterIndex(store["letters"].tolist(), store["features"], store["offsets"])
 
-def translate_breath(b):
+_letter_index = None
+
+def get_letter_index():
+    """
+    Letter fingerprints, loaded on first use. The store is (re)built from the CSV
+    if it is missing or the CSV has changed since.
+    """
+    global _letter_index
+    if _letter_index is None:
+        if letter_store_stale():
+            print(f"Building {FINGERPRINT_STORE} from {FINGERPRINT_CSV}")
+            build_letter_store()
+        _letter_index = load_letter_store()
+    return _letter_index
+
+def translate_breath(b, batched=True):
     transcript = ""
     breath_audio, sr = load_audio(b)
-    duration = librosa.get_duration(y=breath_audio, sr=sr) * 1000
-    breath = AudioSegment.from_wav(b)
-
+    letter_index = get_letter_index()
 
-    for x in range(0, int(duration), 200):
-        breath_fragment = breath[x:x+200]
-        temp_output = "temp_fragment.wav"
-        breath_fragment.export(temp_output, format='wav')
+    if batched:
+        # one STFT and one peak map for the whole recording
+        fragment_fingerprints = fingerprint_fragments(breath_audio, sr)
+    else:
+        fragment_fingerprints = (fingerprint_signal(breath_audio[start:end])
+                                 for start, end in fragment_bounds(len(breath_audio), sr))
 
-        # comparing
-        best_similarity = {}
-        breath_fragment_fp = extract_audio_fingerprint(temp_output)
+    for breath_fragment_fp in fragment_fingerprints:
+        # comparing against every letter at once
         # print(f"breath fragment fingerprint: {breath_fragment_fp}")
-        # Apply compute_continuous_similarity to each row
-        letters["similarity"] = letters["fingerprint"].apply(
-            lambda fingerprint: compute_continuous_similarity(breath_fragment_fp, fingerprint)
-        )
-        # print(letters["similarity"])
         # Find the letter with the highest similarity
-        best_letter = letters.loc[letters["similarity"].idxmax(), "letter"]
+        best_letter = letter_index.best_letter(breath_fragment_fp)
         transcript += best_letter
     return transcript
+
+if __name__ == "__main__":
+    # python audio_fingerprinting.py build [fingerprint.csv] [fingerprint.npz]
+    if sys.argv[1:2] == ["build"]:
+        build_letter_store(*sys.argv[2:4])
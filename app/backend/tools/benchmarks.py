@@ -0,0 +1,121 @@
+import sys
+import time
+
+import numpy as np
+
+from optimize_audio import gate_samples
+from audio_fingerprinting import generate_features_from_peaks
+
+
+def noise_gate_loop(samples, sample_rate, sample_width, threshold_db=-6.0, level_reduction_db=-24.0,
+                    attack_ms=10, hold_ms=50, decay_ms=100):
+    """
+    Original per-sample noise gate, kept as the reference for gate_samples.
+    """
+    attack_samples = int(sample_rate * (attack_ms / 1000))
+    hold_samples = int(sample_rate * (hold_ms / 1000))
+    decay_samples = int(sample_rate * (decay_ms / 1000))
+    threshold_linear = 10 ** (threshold_db / 20)
+    reduction_factor = 10 ** (level_reduction_db / 20)
+
+    envelope = 0
+    hold_counter = 0
+    processed_samples = []
+    for sample in samples:
+        amplitude = abs(int(sample)) / (2 ** (8 * sample_width - 1))
+        if amplitude > threshold_linear:
+            envelope = max(envelope, amplitude)
+            hold_counter = hold_samples
+        else:
+            if hold_counter > 0:
+                hold_counter -= 1
+            else:
+                envelope -= (1 / decay_samples)
+                envelope = max(envelope, 0)
+        if envelope > amplitude:
+            amplitude = amplitude + (envelope - amplitude) / attack_samples
+        if envelope < threshold_linear:
+            amplitude *= reduction_factor
+        processed_samples.append(int(amplitude * (2 ** (8 * sample_width - 1))))
+    return np.array(processed_samples)
+
+
+def synthetic_breath(seconds, sample_rate=44100, channels=2, seed=0):
+    """
+    Noise with a slow breathing envelope, interleaved like pydub's get_array_of_samples().
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate) * channels
+    envelope = np.sin(np.linspace(0, seconds * np.pi / 2, n)) ** 8
+    return (rng.standard_normal(n) * envelope * 30000).clip(-32767, 32767).astype(np.int16)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def benchmark_noise_gate(durations=(1, 5, 20)):
+    print("noise gate, 44.1 kHz stereo")
+    print(f"{'seconds':>8} {'loop, s':>10} {'vectorized, s':>14} {'speedup':>8} {'max diff':>9}")
+    for seconds in durations:
+        samples = synthetic_breath(seconds)
+        expected, loop_time = timed(noise_gate_loop, samples, 44100, 2)
+        actual, vectorized_time = timed(gate_samples, samples, 44100, 2)
+        max_diff = int(np.max(np.abs(expected - actual)))
+        print(f"{seconds:>8} {loop_time:>10.3f} {vectorized_time:>14.4f} {loop_time / vectorized_time:>7.0f}x {max_diff:>9}")
+
+
+def generate_features_loop(peaks, fan_value=5, delta_time_max=10):
+    """
+    Original nested-loop pair generation, kept as the reference for generate_features_from_peaks.
+    """
+    peaks = sorted(peaks, key=lambda x: x[1])  # sort by time
+    features = []
+    num_peaks = len(peaks)
+    for i in range(num_peaks):
+        freq1, time1 = peaks[i]
+        for j in range(1, fan_value + 1):
+            if i + j < num_peaks:
+                freq2, time2 = peaks[i + j]
+                time_delta = time2 - time1
+                if 0 < time_delta <= delta_time_max:
+                    features.append((freq1, freq2, time_delta))
+    return features
+
+
+def synthetic_peaks(count, bins=1025, seed=0):
+    """
+    (freq, time) peaks in np.where order, as extract_peaks produces them,
+    about two peaks per STFT frame like a busy breath spectrogram.
+    """
+    rng = np.random.default_rng(seed)
+    frames = max(count // 2, 10)
+    cells = rng.choice(bins * frames, size=count, replace=False)
+    cells.sort()
+    return np.column_stack([cells // frames, cells % frames])
+
+
+def benchmark_peak_pairs(counts=(100, 1000, 10000, 50000)):
+    print("peak pair generation, fan_value=5")
+    print(f"{'peaks':>8} {'loop, s':>10} {'vectorized, s':>14} {'speedup':>8} {'features':>9} {'same':>5}")
+    for count in counts:
+        peaks = synthetic_peaks(count)
+        peak_list = [tuple(peak) for peak in peaks.tolist()]
+        expected, loop_time = timed(generate_features_loop, peak_list)
+        actual, vectorized_time = timed(generate_features_from_peaks, peaks)
+        same = np.array_equal(np.array(expected).reshape(-1, 3), actual)
+        print(f"{count:>8} {loop_time:>10.4f} {vectorized_time:>14.5f} {loop_time / vectorized_time:>7.0f}x {len(actual):>9} {same!s:>5}")
+
+
+BENCHMARKS = {
+    "noise_gate": benchmark_noise_gate,
+    "peak_pairs": benchmark_peak_pairs,
+}
+
+
+if __name__ == "__main__":
+    # python benchmarks.py [name ...]
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
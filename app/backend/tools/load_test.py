@@ -0,0 +1,92 @@
+"""
+Live-transcription load test: simulated clients stream a recording to the workers in real time
+and the transcription results coming back are counted.
+
+    python load_test.py recording.webm --urls http://localhost:5001 --clients 8
+    python load_test.py recording.webm --urls http://localhost:5001,http://localhost:5002 --clients 8
+
+Clients are spread round-robin over --urls. Start the workers with app/main.py, once with
+--workers 1 and once with --workers N, and compare the output: with enough clients to
+saturate one worker, transcribed chunks/s grow with the worker count while the lag stays flat.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import threading
+import time
+
+import socketio
+
+CHUNK_INTERVAL = 0.2  # s, the frontend sends a chunk every 200 ms
+DROPPED_SYMBOL = "?"
+
+
+def recording_seconds(path):
+    probe = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path],
+                           capture_output=True, text=True, check=True)
+    return float(json.loads(probe.stdout)["format"]["duration"])
+
+
+class Client:
+    def __init__(self, url, recording, chunks):
+        self.url = url
+        self.recording = recording
+        self.chunks = chunks
+        self.letters = 0
+        self.dropped = 0
+        self.lags = []
+        self.sio = socketio.Client()
+        self.sio.on('transcription_result', self.on_result)
+
+    def on_result(self, payload):
+        self.letters += len(payload['letter'])
+        self.dropped += payload['letter'].count(DROPPED_SYMBOL)
+        self.lags.append(payload.get('lag_ms', 0))
+
+    def run(self):
+        self.sio.connect(self.url, transports=['websocket'])
+        size = -(-len(self.recording) // self.chunks)
+        started = time.monotonic()
+        for i in range(self.chunks):
+            self.sio.emit('audio_chunk', self.recording[i * size:(i + 1) * size])
+            time.sleep(max(0.0, started + (i + 1) * CHUNK_INTERVAL - time.monotonic()))
+        # let the worker drain what is still queued
+        time.sleep(2)
+        self.sio.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="webm/opus recording, as the browser sends it")
+    parser.add_argument("--urls", default="http://localhost:5001", help="comma-separated worker URLs")
+    parser.add_argument("--clients", type=int, default=4)
+    args = parser.parse_args()
+
+    with open(args.recording, "rb") as f:
+        recording = f.read()
+    urls = args.urls.split(",")
+    # sent in real time, one piece every 200 ms like MediaRecorder.requestData
+    chunks = max(1, round(recording_seconds(args.recording) / CHUNK_INTERVAL))
+    clients = [Client(urls[i % len(urls)], recording, chunks) for i in range(args.clients)]
+    threads = [threading.Thread(target=client.run) for client in clients]
+
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    letters = sum(client.letters for client in clients)
+    dropped = sum(client.dropped for client in clients)
+    lags = sorted(lag for client in clients for lag in client.lags) or [0]
+    print(f"workers: {len(urls)}, clients: {args.clients}, {chunks} chunks each")
+    print(f"chunks transcribed: {letters - dropped} of {args.clients * chunks}, dropped {dropped}, "
+          f"{(letters - dropped) / elapsed:.1f} chunks/s")
+    print(f"lag ms: median {statistics.median(lags):.0f}, "
+          f"p95 {lags[min(len(lags) - 1, int(len(lags) * 0.95))]:.0f}, max {lags[-1]:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -47,56 +47,68 @@ def custom_equalizer(input_file, output_file):
     wavfile.write(output_file, sample_rate, equalized_audio)
 
 
-def noise_gate(audio_file, output_file, threshold_db=-6.0, level_reduction_db=-24.0, 
-                     attack_ms=10, hold_ms=50, decay_ms=100):
-    audio = AudioSegment.from_file(audio_file)
-    samples = np.array(audio.get_array_of_samples())
-    sample_rate = audio.frame_rate
-    sample_width = audio.sample_width
-    channels = audio.channels
-    
+def gate_samples(samples, sample_rate, sample_width, threshold_db=-6.0, level_reduction_db=-24.0,
+                 attack_ms=10, hold_ms=50, decay_ms=100):
+    """
+    Noise gate over an array of (interleaved) samples, vectorized.
+
+    The envelope follows the sample-by-sample definition: samples above the threshold raise
+    the envelope and restart the hold counter, after `hold` samples without a trigger it
+    decays linearly by 1/decay per sample. Between triggers that is a max-plus recursion
+    E_k = max(a_k, E_prev - decay_k), solved for all triggers at once with a cumulative max.
+    Output matches the per-sample loop to within one LSB (float summation order only).
+    """
+    full_scale = 2 ** (8 * sample_width - 1)
+
     # Convert attack, hold, and decay from ms to samples
     attack_samples = int(sample_rate * (attack_ms / 1000))
     hold_samples = int(sample_rate * (hold_ms / 1000))
     decay_samples = int(sample_rate * (decay_ms / 1000))
-    
+
     # Threshold and level reduction in linear scale
     threshold_linear = 10 ** (threshold_db / 20)
     reduction_factor = 10 ** (level_reduction_db / 20)
-    
-    # Process samples
-    envelope = 0  # Tracks signal envelope
-    hold_counter = 0
-    processed_samples = []
-    
-    for i, sample in enumerate(samples):
-        amplitude = abs(sample) / (2 ** (8 * sample_width - 1))  # Normalize amplitude
-        
-        # Noise gate logic
-        if amplitude > threshold_linear:
-            envelope = max(envelope, amplitude)  # Update envelope
-            hold_counter = hold_samples         # Reset hold counter
-        else:
-            if hold_counter > 0:
-                hold_counter -= 1
-            else:
-                envelope -= (1 / decay_samples)  # Gradually reduce envelope
-                envelope = max(envelope, 0)      # Prevent negative values
-        
-        # Apply attack smoothing
-        if envelope > amplitude:
-            amplitude = amplitude + (envelope - amplitude) / attack_samples
-        
-        # Apply level reduction if gated
-        if envelope < threshold_linear:
-            amplitude *= reduction_factor
-        
-        # Re-scale back to sample range
-        processed_sample = int(amplitude * (2 ** (8 * sample_width - 1)))
-        processed_samples.append(processed_sample)
-    
+
+    amplitude = np.abs(np.asarray(samples, dtype=np.float64)) / full_scale  # Normalize amplitude
+    n = len(amplitude)
+
+    # Envelope value at every trigger (sample above the threshold)
+    is_trigger = amplitude > threshold_linear
+    triggers = np.flatnonzero(is_trigger)
+    envelope = np.zeros(n)
+    if len(triggers):
+        gaps = np.diff(triggers, prepend=triggers[0]) - 1
+        decay = np.maximum(gaps - hold_samples, 0) / decay_samples
+        decay_total = np.cumsum(decay)
+        trigger_envelope = np.maximum.accumulate(amplitude[triggers] + decay_total) - decay_total
+
+        # Every other sample holds, then decays from the last trigger before it
+        position = np.cumsum(is_trigger) - 1
+        active = position >= 0
+        since = np.flatnonzero(active) - triggers[position[active]]
+        envelope[active] = np.maximum(trigger_envelope[position[active]] - np.maximum(since - hold_samples, 0) / decay_samples, 0)
+
+    # Apply attack smoothing
+    smoothed = np.where(envelope > amplitude, amplitude + (envelope - amplitude) / attack_samples, amplitude)
+
+    # Apply level reduction if gated
+    gated = np.where(envelope < threshold_linear, smoothed * reduction_factor, smoothed)
+
+    # Re-scale back to sample range
+    return (gated * full_scale).astype(np.int64)
+
+
+def noise_gate(audio_file, output_file, threshold_db=-6.0, level_reduction_db=-24.0, 
+                     attack_ms=10, hold_ms=50, decay_ms=100):
+    audio = AudioSegment.from_file(audio_file)
+    samples = np.array(audio.get_array_of_samples())
+    sample_rate = audio.frame_rate
+
+    processed_samples = gate_samples(samples, sample_rate, audio.sample_width, threshold_db, level_reduction_db,
+                                     attack_ms, hold_ms, decay_ms)
+
     # Convert processed samples back to AudioSegment
-    gated_audio = audio._spawn(np.array(processed_samples, dtype=np.int16).tobytes())
+    gated_audio = audio._spawn(processed_samples.astype(np.int16).tobytes())
     gated_audio = gated_audio.set_frame_rate(sample_rate)
     
     # Save output audio
@@ -1,7 +1,7 @@
 import librosa
 import numpy as np
 import glob
-from pydub import AudioSegment
+from scipy.fft import next_fast_len, rfft, irfft
 from scipy.signal import correlate
 
 
@@ -20,27 +20,71 @@ def compare_waveforms(signal1, signal2):
     max_corr = np.max(correlation)
     return max_corr
 
+
+class TemplateBank:
+    """
+    Letter templates normalized once and kept as a matrix, so a fragment is
+    cross-correlated with every template in a single batched FFT.
+    scores(fragment)[i] equals compare_waveforms(fragment, templates[i]).
+    """
+
+    def __init__(self, names, templates):
+        self.names = list(names)
+        templates = [np.asarray(template, dtype=np.float64) for template in templates]
+        self.lengths = np.array([len(template) for template in templates])
+        self.length = int(self.lengths.max())
+        # Reversed and right-aligned: correlation is convolution with the reversed template,
+        # and a shorter template then only adds zero lags at the start
+        self.reversed = np.zeros((len(templates), self.length))
+        for i, template in enumerate(templates):
+            self.reversed[i, self.length - len(template):] = template[::-1] / np.max(np.abs(template))
+        self._spectra = {}
+
+    def _spectrum(self, n_fft):
+        spectrum = self._spectra.get(n_fft)
+        if spectrum is None:
+            spectrum = self._spectra[n_fft] = rfft(self.reversed, n_fft, axis=1)
+        return spectrum
+
+    def scores(self, fragment):
+        signal = np.asarray(fragment, dtype=np.float64)
+        signal = signal / np.max(np.abs(signal))
+        n = len(signal) + self.length - 1
+        n_fft = next_fast_len(n, real=True)
+        correlation = irfft(rfft(signal, n_fft) * self._spectrum(n_fft), n_fft, axis=1)[:, :n]
+        # lags that only overlap a template's zero padding are not real lags of that template
+        valid = np.arange(n) >= (self.length - self.lengths)[:, None]
+        return np.where(valid, correlation, -np.inf).max(axis=1)
+
+    def best(self, fragment):
+        return self.names[int(np.argmax(self.scores(fragment)))]
+
+
 letters = glob.glob("letters_source_files/*.wav")
 
+_template_bank = None
+
+def get_template_bank():
+    """
+    Templates from letters_source_files, loaded on first use.
+    """
+    global _template_bank
+    if _template_bank is None:
+        _template_bank = TemplateBank([letter[-5] for letter in letters],
+                                      [load_audio(letter)[0] for letter in letters])
+    return _template_bank
+
 def translate_breath(b):
     transcript = ""
     breath_audio, sr = load_audio(b)
     duration = librosa.get_duration(y=breath_audio, sr=sr) * 1000
-    breath = AudioSegment.from_wav(b)
+    templates = get_template_bank()
 
     print(b + ":", end=' ')
     for x in range(0, int(duration), 200):
-        breath_fragment = breath[x:x+200]
-        temp_output = "temp_fragment.wav"
-        breath_fragment.export(temp_output, format='wav')
-
-        # comparing
-        best_similarity = {}
-        breath_fragment_for_comparing, sr1 = load_audio(temp_output)
-        for letter in letters:
-            # print(letter)
-            current_letter, sr2 = load_audio(letter)
-            waveform_similarity = compare_waveforms(breath_fragment_for_comparing, current_letter)
-            best_similarity[letter[-5]] = float(waveform_similarity)
-        transcript += max(best_similarity, key=best_similarity.get)
-    return transcript
\ No newline at end of file
+        # same samples as exporting breath[x:x+200] and loading it back
+        breath_fragment = breath_audio[int(x * sr / 1000):int((x + 200) * sr / 1000)]
+
+        # comparing with every letter at once
+        transcript += templates.best(breath_fragment)
+    return transcript
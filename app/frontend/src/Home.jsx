@@ -87,10 +87,12 @@ function timeStringToSeconds (t) {
   const rawStreamRef    = useRef(null)
   const cleanupFns      = useRef([])
   const sidRef          = useRef(null)
+  const slowDownRef     = useRef(false)
   const wavesurferRef   = useRef(null)
   const panelRef = useRef(null);
 
   const [liveText, setLiveText]       = useState('')
+  const [livePrediction, setLivePrediction] = useState(null)
   const [rows, setRows]               = useState([])  // transcript table
   const [step, setStep]               = useState('inhale')
   const [clock, setClock]             = useState('00:00:00:000')
@@ -113,6 +115,18 @@ function timeStringToSeconds (t) {
     setFileSent(false);
   };
 
+  // /upload only queues the markup, poll the job until the result is ready
+  const waitForJob = async (jobId) => {
+    while (true) {
+      const res = await fetch(`http://127.0.0.1:5001/jobs/${jobId}`, { credentials: 'include' });
+      if (!res.ok) throw new Error('Job lookup failed');
+      const job = await res.json();
+      if (job.status === 'done') return job.result;
+      if (job.status === 'failed') throw new Error(job.error);
+      await new Promise(resolve => setTimeout(resolve, 500));
+    }
+  };
+
   const handleFileSend = async () => {
     if (!uploadedFile) return;
     const fd = new FormData();
@@ -131,8 +145,9 @@ function timeStringToSeconds (t) {
         credentials: 'include',
       });
       if (!res.ok) throw new Error('Upload failed');
-      const data = await res.json();
+      const { job_id } = await res.json();
       console.log('File uploaded successfully');
+      const data = await waitForJob(job_id);
       const parsedRows = data.transcript.map(item => ({
         transcript: item.transcript,
         recording_time: item.time,
@@ -195,6 +210,10 @@ function timeStringToSeconds (t) {
     socket.on('transcription_result', ({ letter }) => setLiveText(t => t + letter))
     // socket.on('transcription_result', ({ letter }) => console.log("got a letter:", letter))
     socket.on('silence', () => handleCut())
+    // running inhale/exhale and activity guess for the phase since the last cut
+    socket.on('live_prediction', prediction => setLivePrediction(prediction))
+    // the server is behind: send fewer, larger chunks until it catches up
+    socket.on('slow_down', ({ slow_down }) => { slowDownRef.current = slow_down })
     return () => socket.disconnect()
   }, [socket])
 
@@ -291,7 +310,7 @@ function timeStringToSeconds (t) {
       mediaRecRef.current.start()
 
       // flush every 200ms
-      const flushInt = setInterval(() => mediaRecRef.current.requestData(), 200)
+      const flushInt = setInterval(() => { if (!slowDownRef.current) mediaRecRef.current.requestData() }, 200)
       cleanupFns.current.push(() => clearInterval(flushInt))
     } catch (err) {
       console.error('mic error', err)
@@ -497,6 +516,13 @@ useEffect(() => {
               >
                 <p>{liveText}</p>
               </div>
+              {livePrediction && (
+                <p className="w-200 font-regular text-sm text-gray-500">
+                  {[livePrediction.ie_predicted_text || livePrediction.ie_predicted_audio,
+                    livePrediction.activity_predicted_text || livePrediction.activity_predicted_audio]
+                    .filter(Boolean).join(' · ')}
+                </p>
+              )}
               <div id="waveform" className="w-200 font-regular text-sm"></div>
               </div>
             )}
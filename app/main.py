@@ -1,5 +1,57 @@
-from webapp import app, socketio
+"""
+Starts the backend.
 
+    python app/main.py                  one worker on PORT (5001)
+    python app/main.py --workers 4      workers 0..3 on PORT..PORT+3
 
-if __name__ == '__main__':       
-    socketio.run(host='0.0.0.0', debug=True, port=8080)
\ No newline at end of file
+Run it from the repository root, where models/ and web_recordings/ are.
+Several workers need SOCKETIO_MESSAGE_QUEUE and SESSION_STORE_URL (e.g. redis://localhost:6379/0)
+and a proxy with sticky sessions (nginx ip_hash) in front of them; requests that need a
+session's decoder are redirected to the worker that owns it through WORKER_URLS.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+
+def serve(host, port, debug):
+    # the backend imports its helpers as top-level src/tools packages
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ["PORT"] = str(port)
+    from backend import app, socketio
+    socketio.run(app, host=host, port=port, debug=debug, use_reloader=False)
+
+
+def spawn_workers(count, host, port, public_host):
+    urls = ",".join(f"http://{public_host}:{port + i}" for i in range(count))
+    processes = []
+    for worker_id in range(count):
+        env = dict(os.environ, WORKER_ID=str(worker_id), WORKER_URLS=urls)
+        processes.append(subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                                           "--host", host, "--port", str(port + worker_id)], env=env))
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Breathing analysis backend")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 5001)))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--public-host", default="localhost", help="host name clients use to reach the workers")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if not os.getenv("SOCKETIO_MESSAGE_QUEUE") or not os.getenv("SESSION_STORE_URL"):
+            parser.error("--workers > 1 needs SOCKETIO_MESSAGE_QUEUE and SESSION_STORE_URL")
+        spawn_workers(args.workers, args.host, args.port, args.public_host)
+    else:
+        serve(args.host, args.port, args.debug)